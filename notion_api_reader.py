@@ -0,0 +1,402 @@
+import json
+import re
+import sys
+import argparse
+from datetime import datetime
+
+from notion_markdown import render_block, render_metadata
+
+# API block types whose desktop cache name differs
+API_TYPES = {
+    'paragraph': 'text',
+    'heading_1': 'header',
+    'heading_2': 'sub_header',
+    'heading_3': 'sub_sub_header',
+    'child_page': 'page',
+    'child_database': 'collection_view_page',
+}
+
+# API annotation flags and their desktop rich text codes
+ANNOTATION_CODES = (
+    ('bold', 'b'),
+    ('italic', 'i'),
+    ('strikethrough', 's'),
+    ('underline', '_'),
+    ('code', 'c'),
+)
+
+# Block types carrying a file URL
+FILE_TYPES = ('image', 'file', 'video', 'pdf', 'audio')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ResponseStream:
+    """Incremental reader of one Notion API list response
+
+    The top-level object is tokenised by hand and each element of results is
+    decoded on its own with json.JSONDecoder.raw_decode, so memory holds one
+    read buffer plus the current block, whatever the size of the file. The
+    other top-level keys (next_cursor, has_more, ...) are collected in meta;
+    keys that follow results are only known once iteration has finished.
+    """
+
+    def __init__(self, f, chunk_size=1 << 16):
+        """Initialise ResponseStream
+
+        Args:
+            f (file): Text file handle positioned at the response
+            chunk_size (int): Characters read at a time
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.meta = {}
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Append the next chunk to the unread part of the buffer
+
+        A value that still does not fit doubles the read size, so re-decoding
+        a large block costs linear rather than quadratic time.
+        """
+        if self._eof:
+            return False
+        data = self.f.read(max(self.chunk_size, len(self._buffer) - self._pos))
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or '' at the end"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at character {self._pos}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Decode the next complete JSON value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending exactly at the buffer end may be cut short
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        """Yield each element of results"""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'results':
+                self._expect('[')
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self.meta[key] = self._value()
+            if self._expect(',}') == '}':
+                return
+
+
+def _parent_id(parent):
+    """ID of the page, block or database a block belongs to"""
+    if not parent:
+        return None
+    return parent.get(parent.get('type'))
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def convert_rich_text(rich_text):
+    """Convert API rich text objects to the desktop [[text, [[format]]]] form
+
+    Mentions keep their display text (page title, @name, date), linked to
+    their href when they have one; inline equations become ['⁍', [['e', ...]]].
+
+    Args:
+        rich_text (list): API rich text objects
+
+    Returns:
+        list: Desktop rich text segments
+    """
+    segments = []
+    for item in rich_text or []:
+        if item.get('type') == 'equation':
+            segments.append(['⁍', [['e', item['equation'].get('expression', '')]]])
+            continue
+        annotations = item.get('annotations') or {}
+        formats = [[code] for flag, code in ANNOTATION_CODES if annotations.get(flag)]
+        if item.get('href'):
+            formats.append(['a', item['href']])
+        text = item.get('plain_text')
+        if text is None:
+            text = (item.get('text') or {}).get('content', '')
+        segments.append([text, formats] if formats else [text])
+    return segments
+
+
+def normalize_block(data, level=1, content=None):
+    """Turn an API block object into the block model the renderers consume
+
+    The result has the same keys as a row of NotionPageReader.get_page_blocks.
+
+    Args:
+        data (dict): API block object
+        level (int): Depth below the page, 1 for its direct children
+        content (list): Child block IDs, when not given inline
+
+    Returns:
+        dict: Block data
+    """
+    api_type = data.get('type')
+    body = data.get(api_type) or {}
+    properties = {}
+
+    if 'rich_text' in body:
+        properties['title'] = convert_rich_text(body['rich_text'])
+    if isinstance(body.get('title'), str):
+        properties['title'] = [[body['title']]]
+    if 'expression' in body:
+        properties['title'] = [[body['expression']]]
+    if 'checked' in body:
+        properties['checked'] = [['Yes' if body['checked'] else 'No']]
+    if body.get('language'):
+        properties['language'] = [[body['language']]]
+    if body.get('caption'):
+        properties['caption'] = convert_rich_text(body['caption'])
+    if api_type in FILE_TYPES:
+        source = (body.get(body.get('type')) or {}).get('url')
+        if source:
+            properties['source'] = [[source]]
+    elif body.get('url'):
+        properties['link'] = [[body['url']]]
+    if 'cells' in body:
+        properties = {str(i): convert_rich_text(cell) for i, cell in enumerate(body['cells'])}
+
+    children = body.get('children') or data.get('children')
+    if children:
+        content = [child.get('id') for child in children]
+
+    created_by = data.get('created_by') or {}
+    last_edited_by = data.get('last_edited_by') or {}
+    return {
+        'id': data.get('id'),
+        'parent_id': _parent_id(data.get('parent')),
+        'type': API_TYPES.get(api_type, api_type),
+        'properties': properties or None,
+        'content': content or None,
+        'version': None,
+        'created_time': _parse_time(data.get('created_time')),
+        'created_by_id': created_by.get('id'),
+        'created_by_name': created_by.get('name'),
+        'last_edited_time': _parse_time(data.get('last_edited_time')),
+        'last_edited_by_id': last_edited_by.get('id'),
+        'level': level,
+        'alive': 0 if data.get('archived') or data.get('in_trash') else 1,
+    }
+
+
+class NotionApiReader:
+    """Render Notion public-API block list responses to Markdown
+
+    Responses may be split over many files: pages of one list are linked by
+    next_cursor (the ID of the first block of the following page) and the
+    children of a block are listed in responses whose blocks have that block
+    as parent. Children given inline under "children" are used as well.
+    Files are streamed, so memory depends on the depth of the page and the
+    number of files, not on their size.
+    """
+
+    def __init__(self, paths):
+        """Initialise NotionApiReader and link the responses into chains
+
+        Args:
+            paths (list): Paths of JSON list responses, in any order
+        """
+        self.paths = list(paths)
+        self.chains = {}
+        self.page_ids = []
+        self._link_responses()
+
+    def _link_responses(self):
+        """Group the response files by parent and order each group by next_cursor"""
+        groups = {}
+        for path in self.paths:
+            with open(path, encoding='utf-8') as f:
+                stream = ResponseStream(f)
+                first = None
+                for item in stream:
+                    if first is None:
+                        first = item
+            if first is None:
+                continue
+            parent = first.get('parent') or {}
+            groups.setdefault(_parent_id(parent), []).append({
+                'path': path,
+                'first_id': first.get('id'),
+                'next_cursor': stream.meta.get('next_cursor'),
+                'parent_type': parent.get('type'),
+            })
+
+        for parent_id, responses in groups.items():
+            by_first_id = {response['first_id']: response for response in responses}
+            continued = {response['next_cursor'] for response in responses if response['next_cursor']}
+            heads = [response for response in responses if response['first_id'] not in continued]
+            if len(heads) != 1:
+                raise Exception(f"Cannot order the responses of {parent_id}: {len(heads)} chain starts")
+
+            chain = []
+            response = heads[0]
+            while response is not None:
+                chain.append(response['path'])
+                response = by_first_id.get(response['next_cursor']) if response['next_cursor'] else None
+            if len(chain) != len(responses):
+                raise Exception(f"Responses of {parent_id} do not form a single next_cursor chain")
+
+            self.chains[parent_id] = chain
+            if heads[0]['parent_type'] != 'block_id':
+                self.page_ids.append(parent_id)
+
+    def _iter_chain(self, parent_id):
+        """Stream the raw API blocks listed under a parent, in order"""
+        for path in self.chains.get(parent_id, []):
+            with open(path, encoding='utf-8') as f:
+                yield from ResponseStream(f)
+
+    def _iter_children(self, data, level):
+        """Yield the normalised children of an API block"""
+        body = data.get(data.get('type')) or {}
+        children = body.get('children') or data.get('children')
+        if children is None:
+            children = self._iter_chain(data.get('id'))
+        for child in children:
+            yield child, self._normalize(child, level)
+
+    def _normalize(self, data, level):
+        content = None
+        if data.get('has_children') and not ((data.get(data.get('type')) or {}).get('children')
+                                              or data.get('children')):
+            # Child IDs come from a separate response chain, read ahead for content
+            content = [child.get('id') for child in self._iter_chain(data.get('id'))]
+        return normalize_block(data, level, content)
+
+    def iter_blocks(self, page_id=None):
+        """Yield the normalised direct children of a page
+
+        Args:
+            page_id (str): Page to read, defaults to the only page of the export
+
+        Yields:
+            dict: Block data
+        """
+        for _, block in self._iter_children({'id': self._page(page_id), 'type': None}, 1):
+            yield block
+
+    def _page(self, page_id):
+        if page_id is None:
+            if len(self.page_ids) != 1:
+                raise Exception(f"The export holds {len(self.page_ids)} pages, choose one of {self.page_ids}")
+            return self.page_ids[0]
+        if page_id not in self.chains:
+            raise Exception(f"Page not found in the export: {page_id}")
+        return page_id
+
+    def iter_markdown(self, page_id=None, debug=False):
+        """Yield the Markdown lines of a page, rendering blocks as they are read
+
+        The tree is walked depth-first with an explicit stack of child
+        iterators, using the same rules as NotionPageReader.iter_page_markdown.
+
+        Args:
+            page_id (str): Page to render, defaults to the only page of the export
+            debug (bool): Enable debug mode
+
+        Yields:
+            str: Markdown lines
+        """
+        stack = [self._iter_children({'id': self._page(page_id), 'type': None}, 1)]
+        while stack:
+            level = len(stack)
+            for data, block in stack[-1]:
+                if level == 1 and not debug and block['alive'] != 1:
+                    continue
+                md, has_content = render_block(block, "  " * (level - 1), debug)
+                if debug:
+                    md = md + render_metadata(block)
+                # Blocks without content are dropped with their children unless debugging
+                if not (debug or has_content):
+                    continue
+                yield from md
+                # Children of pages belong to those pages, as in NotionPageReader
+                if block['content'] and block['type'] != 'page':
+                    stack.append(self._iter_children(data, level + 1))
+                    break
+            else:
+                stack.pop()
+
+    def write_markdown(self, out, page_id=None, debug=False):
+        """Stream the Markdown of a page to a file handle, line by line
+
+        Args:
+            out (file): Writable text file handle, e.g. sys.stdout
+            page_id (str): Page to render, defaults to the only page of the export
+            debug (bool): Enable debug mode
+        """
+        for line in self.iter_markdown(page_id, debug):
+            out.write(line)
+            out.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render Notion API block list responses to Markdown')
+    parser.add_argument('paths', nargs='+', help='JSON list responses, e.g. page.json, in any order')
+    parser.add_argument('--page', help='Page ID to render when the export holds several pages')
+    parser.add_argument('--debug', action='store_true', help='Enable debug mode to show detailed info')
+    parser.add_argument('-o', '--output', help='Write Markdown to this file instead of stdout')
+    args = parser.parse_args()
+
+    reader = NotionApiReader(args.paths)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        reader.write_markdown(out, page_id=args.page, debug=args.debug)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from notion_page_reader import NotionPageReader
+from notion_reader import NotionDatabaseReader
+
+
+class _Flight:
+    """One in-flight request shared by every caller asking for the same key"""
+
+    __slots__ = ('future', 'waiters', 'cancelled', 'conn')
+
+    def __init__(self):
+        self.future = None
+        self.waiters = 0
+        self.cancelled = False
+        self.conn = None
+
+
+class AsyncNotionReader:
+    """asyncio front end for NotionPageReader and NotionDatabaseReader
+
+    SQLite work and rendering run on a bounded thread pool, each worker thread
+    using its own read-only connection. Concurrent requests for the same key
+    (e.g. the same page id) are coalesced into a single fetch. Every call takes
+    an optional timeout; when the last caller waiting on a request times out
+    or is cancelled, its running query is interrupted.
+    """
+
+    def __init__(self, db_path, max_workers=4, timeout=None, cache=None):
+        """Initialise AsyncNotionReader
+
+        Args:
+            db_path (str): Path to the Notion database file
+            max_workers (int): Size of the thread pool running SQLite work
+            timeout (float): Default per-request timeout in seconds
+            cache (RenderCache): Optional render cache for the page reader
+        """
+        self.page_reader = NotionPageReader(db_path, cache=cache)
+        self.entry_reader = NotionDatabaseReader(db_path)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='notion-reader')
+        self.timeout = timeout
+        self._flights = {}
+        # Guards flight.conn, so a connection is only interrupted while its flight owns it
+        self._conn_lock = threading.Lock()
+
+    def _run(self, flight, fn, args):
+        """Run fn in a worker thread, exposing its connection for interruption
+
+        The worker thread's connection is reused by the next request it runs,
+        so the flight holds it only while fn runs.
+        """
+        conn = self.page_reader.connect()
+        with self._conn_lock:
+            if flight.cancelled:
+                raise asyncio.CancelledError()
+            flight.conn = conn
+        try:
+            return fn(*args)
+        finally:
+            with self._conn_lock:
+                flight.conn = None
+
+    async def _coalesced(self, key, fn, *args, timeout=None):
+        """Await fn(*args) on the executor, sharing the call with identical requests
+
+        Args:
+            key (tuple): Requests with equal keys share one call
+            fn (callable): Blocking function to run
+            timeout (float): Seconds to wait, defaults to self.timeout
+
+        Returns:
+            The result of fn
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            loop = asyncio.get_running_loop()
+            flight.future = loop.run_in_executor(self.executor, self._run, flight, fn, args)
+            flight.future.add_done_callback(lambda _: self._land(key, flight))
+
+        flight.waiters += 1
+        try:
+            # shield: one caller giving up must not cancel the shared call
+            return await asyncio.wait_for(asyncio.shield(flight.future),
+                                          timeout if timeout is not None else self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if flight.waiters == 1 and not flight.future.done():
+                self._cancel(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _land(self, key, flight):
+        """Forget a finished request so the next caller starts a fresh one"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _cancel(self, key, flight):
+        """Abandon a request nobody waits for, interrupting its query if running"""
+        self._land(key, flight)
+        flight.future.cancel()
+        with self._conn_lock:
+            flight.cancelled = True
+            # Not yet started or already finished: the connection may be another request's by now
+            if flight.conn is not None:
+                flight.conn.interrupt()
+
+    async def get_page_blocks(self, page_id, timeout=None):
+        """Async NotionPageReader.get_page_blocks
+
+        Args:
+            page_id (str): The page ID to get blocks for
+            timeout (float): Seconds to wait, defaults to the reader timeout
+
+        Returns:
+            list: List containing all page blocks
+        """
+        return await self._coalesced(('blocks', page_id), self.page_reader.get_page_blocks, page_id,
+                                     timeout=timeout)
+
+    async def get_entries(self, limit=20, offset=0, after=None, types=None, space_id=None, timeout=None):
+        """Async NotionDatabaseReader.get_entries
+
+        Returns:
+            list: Entry list
+        """
+        key = ('entries', limit, offset, after if after is None or isinstance(after, tuple) else after['id'],
+               tuple(types) if types else None, space_id)
+        return await self._coalesced(
+            key, lambda: self.entry_reader.get_entries(limit, offset, after, types, space_id), timeout=timeout)
+
+    def _render(self, page_id, debug):
+        blocks = self.page_reader.get_page_blocks(page_id) or []
+        return "".join(f"{line}\n" for line in self.page_reader.iter_page_markdown(blocks, debug))
+
+    async def render_page(self, page_id, debug=False, timeout=None):
+        """Fetch and render a page to Markdown
+
+        Args:
+            page_id (str): The page ID to render
+            debug (bool): Enable debug mode
+            timeout (float): Seconds to wait, defaults to the reader timeout
+
+        Returns:
+            str: Markdown text
+        """
+        return await self._coalesced(('render', page_id, debug), self._render, page_id, debug, timeout=timeout)
+
+    def close(self):
+        """Shut the thread pool down"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
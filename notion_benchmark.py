@@ -0,0 +1,156 @@
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+from datetime import datetime
+
+from notion_connection import close_shared_connections
+from notion_fixture import FixtureBuilder
+from notion_page_reader import NotionPageReader
+from notion_reader import NotionDatabaseReader
+from notion_schema import NotionSchemaReader
+
+DEFAULT_SCALES = [1000, 10000, 50000]
+
+
+def _timed(fn, repeat):
+    """Run fn repeat times and summarise the wall-clock durations
+
+    Returns:
+        tuple: (last result, dict of min/median/mean seconds)
+    """
+    # One untimed warm-up run fills the page cache and statement cache
+    result = fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return result, {
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'mean': statistics.fmean(durations),
+        'runs': repeat,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_scale(blocks_per_page, pages=5, depth=6, fanout=8, repeat=5, workdir=None):
+    """Benchmark the readers against one generated fixture
+
+    Args:
+        blocks_per_page (int): Blocks generated under each page
+        pages (int): Number of pages in the fixture
+        depth (int): Maximum nesting depth
+        fanout (int): Maximum children per block
+        repeat (int): Runs per operation
+        workdir (str): Directory for the fixture database
+
+    Returns:
+        list: One result dict per operation
+    """
+    path = os.path.join(workdir or tempfile.gettempdir(), f"notion-bench-{blocks_per_page}.db")
+    info = FixtureBuilder(pages=pages, blocks_per_page=blocks_per_page, depth=depth, fanout=fanout).build(path)
+    page_id = info['page_ids'][0]
+    container_id = info['container_ids'][0]
+
+    try:
+        page_reader = NotionPageReader(path)
+        entry_reader = NotionDatabaseReader(path)
+        schema_reader = NotionSchemaReader(path)
+
+        page_blocks, page_fetch = _timed(lambda: page_reader.get_page_blocks(page_id), repeat)
+        tree_blocks, tree_fetch = _timed(lambda: page_reader.get_page_blocks(container_id), repeat)
+        _, page_render = _timed(lambda: sum(1 for _ in page_reader.iter_page_markdown(page_blocks)), repeat)
+        _, tree_render = _timed(lambda: sum(1 for _ in page_reader.iter_page_markdown(tree_blocks)), repeat)
+        _, entries = _timed(lambda: entry_reader.get_entries(), repeat)
+        _, tables = _timed(lambda: schema_reader.get_tables(), repeat)
+    finally:
+        close_shared_connections()
+        os.remove(path)
+
+    common = {'blocks_per_page': blocks_per_page, 'total_blocks': info['block_count']}
+    return [
+        {**common, 'op': 'get_page_blocks.page', 'rows': len(page_blocks), **page_fetch},
+        {**common, 'op': 'get_page_blocks.recursive', 'rows': len(tree_blocks), **tree_fetch},
+        {**common, 'op': 'render.page', 'rows': len(page_blocks), **page_render},
+        {**common, 'op': 'render.recursive', 'rows': len(tree_blocks), **tree_render},
+        {**common, 'op': 'get_entries', **entries},
+        {**common, 'op': 'get_tables', **tables},
+    ]
+
+
+def compare(results, baseline, threshold=0.1):
+    """Print per-operation ratios against a baseline run
+
+    Args:
+        results (dict): Current benchmark output
+        baseline (dict): Benchmark output of an earlier commit
+        threshold (float): Slowdown ratio above which a result is flagged
+    """
+    previous = {(r['op'], r['blocks_per_page']): r for r in baseline['results']}
+    print(f"Compared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for result in results['results']:
+        before = previous.get((result['op'], result['blocks_per_page']))
+        if not before or not before['median']:
+            continue
+        ratio = result['median'] / before['median']
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"  {result['op']:28} {result['blocks_per_page']:>8}  {before['median'] * 1000:10.2f}ms -> "
+              f"{result['median'] * 1000:10.2f}ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Notion readers on synthetic databases')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='Comma-separated blocks-per-page scales')
+    parser.add_argument('--pages', type=int, default=5, help='Pages per fixture')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum nesting depth')
+    parser.add_argument('--fanout', type=int, default=8, help='Maximum children per block')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per operation')
+    parser.add_argument('-o', '--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': [],
+    }
+    for scale in [int(s) for s in args.scales.split(',') if s]:
+        print(f"Benchmarking {scale} blocks per page...", file=sys.stderr)
+        results['results'].extend(run_scale(scale, pages=args.pages, depth=args.depth,
+                                            fanout=args.fanout, repeat=args.repeat))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
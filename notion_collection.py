@@ -0,0 +1,681 @@
+import sqlite3
+import csv
+import json
+import math
+import operator
+import os
+import struct
+import sys
+import argparse
+from array import array
+from datetime import date, datetime
+from itertools import compress, repeat
+
+from notion_connection import shared_connection
+from notion_markdown import plain_text
+
+NAN = float('nan')
+
+# Schema property types and the column kind they are stored as; anything
+# else is kept as text
+COLUMN_KINDS = {
+    'number': 'number',
+    'date': 'date',
+    'created_time': 'date',
+    'last_edited_time': 'date',
+    'select': 'select',
+    'status': 'select',
+    'checkbox': 'checkbox',
+}
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+SAVE_MAGIC = b'NCOL1\n'
+
+
+def _epoch(value):
+    """Epoch seconds of an ISO date or date-time in local time, or NaN"""
+    if not value:
+        return NAN
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return NAN
+
+
+def _to_epoch(value):
+    """Epoch seconds of a datetime, date, ISO string or number"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    if isinstance(value, str):
+        return _epoch(value)
+    return float(value)
+
+
+class Column:
+    """One property of a collection, stored as a typed array"""
+
+    kind = 'text'
+
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def key(self, value):
+        """Convert a query value to the stored representation"""
+        return value
+
+    def python(self, stored):
+        """Convert a stored value to a Python value, None when empty"""
+        return stored if stored != "" else None
+
+    def missing(self, stored):
+        return stored == ""
+
+    def sort_key(self):
+        """Function mapping a row to its sort key"""
+        return self.values.__getitem__
+
+    def take(self, rows):
+        """Stored values of the given rows, or of all rows"""
+        if rows is None:
+            return self.values
+        return map(self.values.__getitem__, rows)
+
+
+class TextColumn(Column):
+    def __init__(self, name, values):
+        super().__init__(name, values)
+        self._lower = None
+
+    def lower(self, rows):
+        # Lower-cased copy for case-insensitive matching, built on first use
+        if self._lower is None:
+            self._lower = [value.lower() for value in self.values]
+        if rows is None:
+            return self._lower
+        return map(self._lower.__getitem__, rows)
+
+
+class NumberColumn(Column):
+    kind = 'number'
+
+    def key(self, value):
+        return float(value)
+
+    def python(self, stored):
+        return None if stored != stored else stored
+
+    def missing(self, stored):
+        return stored != stored
+
+
+class DateColumn(NumberColumn):
+    """Dates stored as epoch seconds"""
+
+    kind = 'date'
+
+    def key(self, value):
+        return _to_epoch(value)
+
+    def python(self, stored):
+        return None if stored != stored else datetime.fromtimestamp(stored)
+
+
+class CheckboxColumn(Column):
+    kind = 'checkbox'
+
+    def key(self, value):
+        if isinstance(value, str):
+            return int(value.strip().lower() in ('1', 'yes', 'true', 'checked'))
+        return int(bool(value))
+
+    def python(self, stored):
+        return bool(stored)
+
+    def missing(self, stored):
+        return False
+
+
+class SelectColumn(Column):
+    """Dictionary-encoded select: an int code per row, -1 when empty
+
+    Codes follow the option order of the schema, so sorting by code sorts the
+    way Notion does.
+    """
+
+    kind = 'select'
+
+    def __init__(self, name, values, categories):
+        super().__init__(name, values)
+        self.categories = categories
+        self.codes = {category: code for code, category in enumerate(categories)}
+
+    def key(self, value):
+        return self.codes.get(value, -2)
+
+    def python(self, stored):
+        return self.categories[stored] if stored >= 0 else None
+
+    def missing(self, stored):
+        return stored < 0
+
+
+class CollectionTable:
+    """Columnar view of the rows of a collection
+
+    Every property is one array over all rows, typed by its schema kind. A
+    table holds the columns plus an optional array of selected row positions;
+    filter and sort return new tables sharing the same columns, so chained
+    queries never copy column data. Comparisons run through map and compress,
+    keeping per-row work in C.
+    """
+
+    def __init__(self, columns, rows=None):
+        """Initialise CollectionTable
+
+        Args:
+            columns (dict): Column name -> Column, all of the same length
+            rows (array): Selected row positions in order, None for all rows
+        """
+        self.columns = columns
+        self.rows = rows
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __len__(self):
+        if self.rows is not None:
+            return len(self.rows)
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def _positions(self):
+        return self.rows if self.rows is not None else range(len(self))
+
+    def _view(self, rows):
+        return CollectionTable(self.columns, rows if isinstance(rows, array) else array('l', rows))
+
+    def column(self, name):
+        """Python values of a column for the selected rows
+
+        Args:
+            name (str): Property name
+
+        Returns:
+            list: Values, None where empty
+        """
+        column = self.columns[name]
+        return [column.python(stored) for stored in column.take(self.rows)]
+
+    def filter(self, name, op, value=None):
+        """Select the rows whose property matches a condition
+
+        Args:
+            name (str): Property name
+            op (str): ==, !=, <, <=, >, >=, in, contains, empty or not_empty
+            value: Value compared against, converted to the column kind
+
+        Returns:
+            CollectionTable: The matching rows
+        """
+        column = self.columns[name]
+        positions = self._positions()
+        stored = column.take(self.rows)
+
+        if op in OPERATORS:
+            matches = map(OPERATORS[op], stored, repeat(column.key(value)))
+        elif op == 'in':
+            keys = {column.key(item) for item in value}
+            matches = map(keys.__contains__, stored)
+        elif op == 'contains':
+            if not isinstance(column, TextColumn):
+                raise ValueError(f"contains needs a text property, {name} is {column.kind}")
+            matches = map(operator.contains, column.lower(self.rows), repeat(str(value).lower()))
+        elif op == 'empty':
+            matches = map(column.missing, stored)
+        elif op == 'not_empty':
+            matches = map(operator.not_, map(column.missing, stored))
+        else:
+            raise ValueError(f"Unknown operator: {op}")
+        return self._view(compress(positions, matches))
+
+    def sort(self, name, descending=False):
+        """Sort rows by a property, empty values last
+
+        The sort is stable, so sorting by several properties one after the
+        other, least significant first, sorts by all of them.
+
+        Args:
+            name (str): Property name
+            descending (bool): Sort from largest to smallest
+
+        Returns:
+            CollectionTable: The rows in sorted order
+        """
+        column = self.columns[name]
+        positions = self._positions()
+        missing = list(map(column.missing, column.take(self.rows)))
+        present = list(compress(positions, map(operator.not_, missing)))
+        empty = list(compress(positions, missing))
+        present.sort(key=column.sort_key(), reverse=descending)
+        return self._view(present + empty)
+
+    def group_by(self, name):
+        """Split the rows by the value of a property
+
+        Args:
+            name (str): Property name
+
+        Returns:
+            dict: Value (None for empty) -> CollectionTable, in order of first appearance
+        """
+        column = self.columns[name]
+        groups = {}
+        missing = column.missing
+        for position, stored in zip(self._positions(), column.take(self.rows)):
+            # Empty values (NaN never equals itself) share one group
+            key = None if missing(stored) else stored
+            rows = groups.get(key)
+            if rows is None:
+                rows = groups[key] = array('l')
+            rows.append(position)
+        return {None if key is None else column.python(key): self._view(rows) for key, rows in groups.items()}
+
+    def aggregate(self, name, func):
+        """Aggregate a number or date property over the selected rows
+
+        Args:
+            name (str): Property name
+            func (str): count, sum, mean, min or max; dates have no sum
+
+        Returns:
+            Aggregated value, None when no row has a value
+        """
+        if func not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {func}")
+        column = self.columns[name]
+        if func == 'count':
+            return len(self) - sum(map(column.missing, column.take(self.rows)))
+        if not isinstance(column, (NumberColumn, CheckboxColumn)):
+            raise ValueError(f"{func} needs a number, date or checkbox property, {name} is {column.kind}")
+        if func == 'sum' and column.kind == 'date':
+            # A sum of epoch seconds is no date, and soon out of datetime's range
+            raise ValueError(f"sum needs a number or checkbox property, {name} is a date")
+        values = [value for value in column.take(self.rows) if value == value]
+        if not values:
+            return None
+        if func == 'sum':
+            result = math.fsum(values)
+        elif func == 'mean':
+            result = math.fsum(values) / len(values)
+        elif func == 'min':
+            result = min(values)
+        else:
+            result = max(values)
+        if func in ('min', 'max') or column.kind == 'date':
+            # Only min, max and mean reach here for dates
+            return column.python(result)
+        return result
+
+    def summarize(self, by, aggregates):
+        """Group by a property and aggregate others per group
+
+        Args:
+            by (str): Property to group by
+            aggregates (list): (property, func) pairs
+
+        Returns:
+            list: One dict per group, with the group value and the aggregates
+        """
+        result = []
+        for value, group in self.group_by(by).items():
+            row = {by: value, 'rows': len(group)}
+            for name, func in aggregates:
+                row[f"{func}({name})"] = group.aggregate(name, func)
+            result.append(row)
+        return result
+
+    def iter_rows(self):
+        """Yield each selected row as a dict of Python values"""
+        columns = list(self.columns.values())
+        for position in self._positions():
+            yield {column.name: column.python(column.values[position]) for column in columns}
+
+    def to_csv(self, out):
+        """Write the selected rows as CSV with a header row
+
+        Args:
+            out (file): Writable text file handle
+        """
+        writer = csv.writer(out)
+        columns = list(self.columns.values())
+        writer.writerow([column.name for column in columns])
+        cells = [[self._csv_cell(column, stored) for stored in column.take(self.rows)] for column in columns]
+        writer.writerows(zip(*cells))
+
+    @staticmethod
+    def _csv_cell(column, stored):
+        value = column.python(stored)
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def save(self, path):
+        """Write the selected rows to a columnar file
+
+        The file holds a JSON header describing each column followed by the
+        raw array buffers, so numbers, dates, checkboxes and select codes load
+        back without parsing.
+
+        Args:
+            path (str): File to write
+        """
+        header = []
+        buffers = []
+        for column in self.columns.values():
+            stored = column.take(self.rows)
+            entry = {'name': column.name, 'kind': column.kind}
+            if isinstance(column, TextColumn):
+                data = json.dumps(list(stored), ensure_ascii=False).encode('utf-8')
+            else:
+                data = array(column.values.typecode, stored).tobytes()
+                entry['typecode'] = column.values.typecode
+            if isinstance(column, SelectColumn):
+                entry['categories'] = column.categories
+            entry['size'] = len(data)
+            header.append(entry)
+            buffers.append(data)
+
+        header_bytes = json.dumps({'byteorder': sys.byteorder, 'columns': header}, ensure_ascii=False).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(SAVE_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for data in buffers:
+                f.write(data)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save
+
+        Args:
+            path (str): File to read
+
+        Returns:
+            CollectionTable: The saved rows
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(SAVE_MAGIC)) != SAVE_MAGIC:
+                raise ValueError(f"Not a collection table file: {path}")
+            (header_size,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size).decode('utf-8'))
+            columns = {}
+            for entry in header['columns']:
+                data = f.read(entry['size'])
+                if entry['kind'] == 'text':
+                    columns[entry['name']] = TextColumn(entry['name'], json.loads(data.decode('utf-8')))
+                    continue
+                values = array(entry['typecode'])
+                values.frombytes(data)
+                if header['byteorder'] != sys.byteorder:
+                    values.byteswap()
+                if entry['kind'] == 'select':
+                    columns[entry['name']] = SelectColumn(entry['name'], values, entry['categories'])
+                else:
+                    columns[entry['name']] = COLUMN_TYPES[entry['kind']](entry['name'], values)
+        return cls(columns)
+
+
+COLUMN_TYPES = {
+    'number': NumberColumn,
+    'date': DateColumn,
+    'checkbox': CheckboxColumn,
+    'text': TextColumn,
+}
+
+
+class NotionCollectionReader:
+    def __init__(self, db_path, immutable=False, snapshot=False):
+        """Initialise NotionCollectionReader
+
+        Args:
+            db_path (str): Path to the Notion database file
+            immutable (bool): Open the database with immutable=1
+            snapshot (bool): Read from a private copy of the database
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+        self.db_path = db_path
+        self.connection = shared_connection(db_path, immutable=immutable, snapshot=snapshot)
+
+    def connect(self):
+        """Return this thread's shared read-only connection"""
+        try:
+            return self.connection.connection()
+        except sqlite3.Error as e:
+            raise Exception(f"Error connecting to Notion database: {e}")
+
+    def get_collections(self):
+        """List alive collections
+
+        Returns:
+            list: Dicts with id, name and row count
+        """
+        conn = self.connect()
+        collections = []
+        for collection_id, name, rows in conn.execute("""
+            SELECT collection.id, collection.name,
+                   (SELECT count(*) FROM block
+                    WHERE block.parent_id = collection.id AND block.parent_table = 'collection' AND block.alive = 1)
+            FROM collection
+            WHERE collection.alive = 1
+            GROUP BY collection.id
+        """):
+            collections.append({'id': collection_id, 'name': plain_text(_json(name)) or name, 'rows': rows})
+        return collections
+
+    def get_schema(self, collection_id):
+        """Decode the property definitions of a collection
+
+        Args:
+            collection_id (str): Collection ID
+
+        Returns:
+            list: (property ID, name, type, options) per property, title first
+        """
+        row = self.connect().execute("SELECT schema FROM collection WHERE id = ?", (collection_id,)).fetchone()
+        if row is None:
+            raise Exception(f"Collection not found: {collection_id}")
+        schema = _json(row[0]) or {}
+        properties = []
+        for property_id, definition in schema.items():
+            if not isinstance(definition, dict):
+                continue
+            options = [option.get('value') for option in definition.get('options') or [] if isinstance(option, dict)]
+            properties.append((property_id, definition.get('name') or property_id, definition.get('type'), options))
+        properties.sort(key=lambda prop: prop[2] != 'title')
+        return properties
+
+    def load(self, collection_id):
+        """Load the alive rows of a collection into columnar arrays
+
+        Property values are pulled out of the properties JSON by SQLite, one
+        result column per property, and the result is transposed so each
+        column is converted to its typed array in a single pass.
+
+        Args:
+            collection_id (str): Collection ID
+
+        Returns:
+            CollectionTable: One column per property plus id
+        """
+        schema = self.get_schema(collection_id)
+        expressions = []
+        # In placeholder order: the collection_rows filter comes before the expressions
+        params = [collection_id]
+        for property_id, name, prop_type, options in schema:
+            if prop_type in ('created_time', 'last_edited_time'):
+                expressions.append(prop_type)
+                continue
+            path = json.dumps(property_id)
+            kind = COLUMN_KINDS.get(prop_type, 'text')
+            if kind == 'date':
+                # [["‣", [["d", {"start_date": ..., "start_time": ...}]]]]
+                expressions.append("json_extract(properties, ?) || coalesce('T' || json_extract(properties, ?), '')")
+                params.extend([f"$.{path}[0][1][0][1].start_date", f"$.{path}[0][1][0][1].start_time"])
+            elif kind == 'text':
+                expressions.append("""(
+                    SELECT group_concat(json_extract(value, '$[0]'), '')
+                    FROM json_each(properties, ?) WHERE type = 'array'
+                )""")
+                params.append(f"$.{path}")
+            else:
+                expressions.append("json_extract(properties, ?)")
+                params.append(f"$.{path}[0][0]")
+
+        rows = self.connect().execute(f"""
+            WITH collection_rows AS (
+                SELECT
+                    id,
+                    CASE WHEN json_valid(properties) THEN properties END AS properties,
+                    created_time,
+                    last_edited_time
+                FROM block
+                WHERE parent_id = ? AND parent_table = 'collection' AND alive = 1
+            )
+            SELECT id{''.join(f", {expression}" for expression in expressions)}
+            FROM collection_rows
+        """, params).fetchall()
+
+        # The same row may be cached once per meta_user_id
+        ids = [row[0] for row in rows]
+        if len(set(ids)) != len(ids):
+            first = {}
+            for row in rows:
+                first.setdefault(row[0], row)
+            rows = list(first.values())
+        values = list(zip(*rows)) or [()] * (len(schema) + 1)
+
+        columns = {'id': TextColumn('id', list(values[0]))}
+        for (property_id, name, prop_type, options), raw in zip(schema, values[1:]):
+            if name in columns:
+                name = f"{name} ({property_id})"
+            kind = COLUMN_KINDS.get(prop_type, 'text')
+            if prop_type in ('created_time', 'last_edited_time'):
+                columns[name] = DateColumn(name, array('d', (t / 1000 if t else NAN for t in raw)))
+            elif kind == 'number':
+                columns[name] = NumberColumn(name, array('d', map(_number, raw)))
+            elif kind == 'date':
+                columns[name] = DateColumn(name, array('d', map(_epoch, raw)))
+            elif kind == 'checkbox':
+                columns[name] = CheckboxColumn(name, array('b', (value == 'Yes' for value in raw)))
+            elif kind == 'select':
+                raw = list(map(_text, raw))
+                categories = list(options)
+                codes = {category: code for code, category in enumerate(categories)}
+                for value in set(raw):
+                    if value and value not in codes:
+                        codes[value] = len(categories)
+                        categories.append(value)
+                codes[None] = codes[''] = -1
+                columns[name] = SelectColumn(name, array('i', map(codes.__getitem__, raw)), categories)
+            else:
+                columns[name] = TextColumn(name, list(map(_text, raw)))
+        return CollectionTable(columns)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _number(value):
+    if value is None or value == "":
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _json(value):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return value
+
+
+def _parse_condition(condition):
+    """Split "Name>=10" into (name, op, value)"""
+    for op in ('==', '!=', '<=', '>=', '<', '>', '~'):
+        name, found, value = condition.partition(op)
+        if found:
+            return name.strip(), 'contains' if op == '~' else op, value.strip()
+    raise ValueError(f"Cannot parse condition: {condition}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a Notion database (collection) as columns')
+    parser.add_argument('collection_id', nargs='?', help='Collection ID, lists collections when omitted')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to read, e.g. a mirror synced by sqldb.py')
+    parser.add_argument('--where', action='append', default=[],
+                        help='Condition such as "Price>=10" or "Name~draft" (contains), repeatable')
+    parser.add_argument('--sort', action='append', default=[], help='Sort property, prefix with - for descending')
+    parser.add_argument('--group', help='Group by this property and print aggregates')
+    parser.add_argument('--agg', action='append', default=[], help='Aggregate as property:func, e.g. Price:sum')
+    parser.add_argument('--csv', help='Write the resulting rows to this CSV file ("-" for stdout)')
+    parser.add_argument('--save', help='Write the resulting rows to a columnar file')
+    args = parser.parse_args()
+
+    reader = NotionCollectionReader(os.path.expanduser(args.db))
+    if not args.collection_id:
+        for collection in reader.get_collections():
+            print(f"{collection['id']}  {collection['rows']:>8} rows  {collection['name']}")
+        return
+
+    table = reader.load(args.collection_id)
+    for condition in args.where:
+        name, op, value = _parse_condition(condition)
+        table = table.filter(name, op, value)
+    for name in reversed(args.sort):
+        table = table.sort(name.lstrip('-'), descending=name.startswith('-'))
+
+    if args.group:
+        aggregates = [tuple(spec.rsplit(':', 1)) for spec in args.agg]
+        for row in table.summarize(args.group, aggregates):
+            print(json.dumps(row, ensure_ascii=False, default=str))
+    if args.csv:
+        if args.csv == '-':
+            table.to_csv(sys.stdout)
+        else:
+            with open(args.csv, 'w', encoding='utf-8', newline='') as f:
+                table.to_csv(f)
+    if args.save:
+        table.save(args.save)
+    if not (args.group or args.csv or args.save):
+        print(f"{len(table)} rows")
+
+
+if __name__ == "__main__":
+    main()
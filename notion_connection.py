@@ -0,0 +1,178 @@
+import sqlite3
+import atexit
+import os
+import tempfile
+import threading
+from urllib.parse import quote
+
+# Default tuning, applied to every connection
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE = -64 * 1024  # negative values are KiB, i.e. 64 MiB
+CACHED_STATEMENTS = 256
+
+
+def database_uri(path, immutable=False):
+    """Build a read-only SQLite URI for a database file
+
+    Args:
+        path (str): Path to the database file
+        immutable (bool): Add immutable=1
+
+    Returns:
+        str: URI for sqlite3.connect(..., uri=True) or ATTACH
+    """
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return uri
+
+
+class NotionConnection:
+    """Read-only, per-thread SQLite connections to a Notion database
+
+    The database is opened in read-only URI mode so we never take the Notion
+    app's write lock. Each thread gets its own connection, opened once and
+    reused for every query; prepared statements are kept in the sqlite3
+    statement cache.
+
+    With immutable=True SQLite skips all locking and change detection, which is
+    only safe while the Notion app is not writing. With snapshot=True the
+    database is copied once to a private temporary file which is then opened
+    immutable, so reads see a consistent point-in-time view.
+    """
+
+    def __init__(self, db_path, immutable=False, snapshot=False, mmap_size=MMAP_SIZE,
+                 cache_size=CACHE_SIZE, cached_statements=CACHED_STATEMENTS):
+        """Initialise NotionConnection
+
+        Args:
+            db_path (str): Path to the Notion database file
+            immutable (bool): Open the database with immutable=1
+            snapshot (bool): Read from a private copy of the database
+            mmap_size (int): PRAGMA mmap_size in bytes
+            cache_size (int): PRAGMA cache_size (negative for KiB)
+            cached_statements (int): Size of the prepared statement cache
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+
+        self.db_path = os.path.abspath(db_path)
+        self.immutable = immutable
+        self.snapshot = snapshot
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+
+        self._snapshot_path = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+
+    def _take_snapshot(self):
+        """Copy the database to a temporary file with the online backup API"""
+        fd, path = tempfile.mkstemp(prefix="notion-snapshot-", suffix=".db")
+        os.close(fd)
+        source = sqlite3.connect(database_uri(self.db_path, self.immutable), uri=True)
+        try:
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        return path
+
+    def _open(self):
+        if self.snapshot:
+            with self._lock:
+                if self._snapshot_path is None:
+                    self._snapshot_path = self._take_snapshot()
+            uri = database_uri(self._snapshot_path, True)
+        else:
+            uri = database_uri(self.db_path, self.immutable)
+
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def connection(self):
+        """Return the calling thread's connection, opening it on first use
+
+        Returns:
+            sqlite3.Connection: Read-only connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                # Drop connections left behind by threads that have exited
+                alive = {t.ident for t in threading.enumerate()}
+                for ident in [i for i in self._connections if i not in alive]:
+                    self._connections.pop(ident).close()
+                # A thread ident can be reused by a new thread before the cleanup above sees the old one exit
+                previous = self._connections.pop(threading.get_ident(), None)
+                if previous is not None:
+                    previous.close()
+                self._connections[threading.get_ident()] = conn
+        return conn
+
+    def execute(self, sql, parameters=()):
+        """Execute a query on the calling thread's connection
+
+        Returns:
+            sqlite3.Cursor: Cursor over the results
+        """
+        return self.connection().execute(sql, parameters)
+
+    def close(self):
+        """Close every connection and remove the snapshot, if any"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+            self._local = threading.local()
+            if self._snapshot_path:
+                os.remove(self._snapshot_path)
+                self._snapshot_path = None
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_connection(db_path, immutable=False, snapshot=False):
+    """Return the process-wide NotionConnection for a database
+
+    Readers created with the same path and mode share one NotionConnection, so
+    each thread opens the database only once.
+
+    Args:
+        db_path (str): Path to the Notion database file
+        immutable (bool): Open the database with immutable=1
+        snapshot (bool): Read from a private copy of the database
+
+    Returns:
+        NotionConnection: Shared connection manager
+    """
+    key = (os.path.abspath(db_path), immutable, snapshot)
+    with _shared_lock:
+        manager = _shared.get(key)
+        if manager is None:
+            manager = _shared[key] = NotionConnection(db_path, immutable=immutable, snapshot=snapshot)
+        return manager
+
+
+def close_shared_connections():
+    """Close every shared NotionConnection"""
+    with _shared_lock:
+        for manager in _shared.values():
+            manager.close()
+        _shared.clear()
+
+
+atexit.register(close_shared_connections)
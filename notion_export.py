@@ -0,0 +1,322 @@
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from notion_connection import shared_connection
+from notion_page_reader import NotionPageReader, PAGE_TYPES, owning_pages
+
+MANIFEST_NAME = ".export_manifest.json"
+
+# Set in each worker process by _init_worker
+_reader = None
+_debug = False
+
+
+def _page_title(properties):
+    """Plain-text title of a page from its raw properties JSON"""
+    try:
+        title = json.loads(properties or 'null') or {}
+    except json.JSONDecodeError:
+        return ""
+    parts = title.get('title') if isinstance(title, dict) else None
+    if not isinstance(parts, list):
+        return ""
+    return "".join(str(part[0]) for part in parts if isinstance(part, list) and part).strip()
+
+
+def _safe_name(title, page_id):
+    """File name for a page: its title made filesystem safe, plus a short id"""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', title).strip(' .')[:80]
+    return f"{name} {page_id[:8]}" if name else page_id
+
+
+def _init_worker(db_path, debug, comments=False):
+    """Open this worker's own read-only connection
+
+    Workers are spawned, not forked, so no connection of the parent process
+    is inherited; a SQLite handle must not be used across a fork.
+    """
+    global _reader, _debug
+    _reader = NotionPageReader(db_path, comments=comments)
+    _debug = debug
+
+
+def _export_pages(tasks):
+    """Render a batch of pages to their Markdown files
+
+    The blocks of the whole batch are fetched with one get_pages_blocks call,
+    each page with its full content down to, but not into, its child pages.
+
+    Args:
+        tasks (list): (page_id, title, absolute output path) tuples
+
+    Returns:
+        list: (page_id, number of blocks rendered) per page
+    """
+    pages = _reader.get_pages_blocks([page_id for page_id, _, _ in tasks], subtrees=True)
+    if pages is None:
+        # Writing the pages anyway would leave title-only files that the manifest then skips
+        raise Exception(f"Could not fetch the blocks of {len(tasks)} pages, e.g. the database is locked")
+    results = []
+    for page_id, title, path in tasks:
+        blocks = pages.get(page_id, [])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write(f"# {title or page_id}\n\n")
+            _reader.write_markdown(blocks, out, debug=_debug)
+        os.replace(tmp_path, path)
+        results.append((page_id, len(blocks)))
+    return results
+
+
+class NotionExporter:
+    """Parallel Markdown export of every page in a workspace
+
+    Pages are written one file per page, in a directory tree mirroring the
+    page hierarchy. Work is split across a pool of spawned processes, each
+    worker opening its own read-only connection, so scripts calling export()
+    need the usual if __name__ == "__main__" guard. A manifest of exported last_edited_time
+    values and paths makes exports resumable: unchanged pages are skipped,
+    and the files of renamed, moved or deleted pages are removed.
+    """
+
+    def __init__(self, db_path, output_dir):
+        """Initialise NotionExporter
+
+        Args:
+            db_path (str): Notion database (or mirror) to export
+            output_dir (str): Directory the Markdown tree is written to
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.connection = shared_connection(db_path)
+
+    def get_pages(self, space_id=None, root_id=None):
+        """List alive pages with their parent page and relative output path
+
+        Args:
+            space_id (str): Only pages of this space
+            root_id (str): Only this page and the pages beneath it
+
+        Returns:
+            list: Dicts with id, title, last_edited_time and path
+        """
+        conn = self.connection.connection()
+        query = f"""
+            SELECT id, parent_id, parent_table, properties, last_edited_time
+            FROM block
+            WHERE alive = 1 AND type IN ({', '.join('?' * len(PAGE_TYPES))})
+        """
+        params = list(PAGE_TYPES)
+        if space_id:
+            query += " AND space_id = ?"
+            params.append(space_id)
+
+        pages = {}
+        for page_id, parent_id, parent_table, properties, last_edited_time in conn.execute(query, params):
+            pages.setdefault(page_id, {
+                'id': page_id,
+                'parent_id': parent_id if parent_table == 'block' else None,
+                'title': _page_title(properties),
+                'last_edited_time': last_edited_time,
+            })
+
+        # The parent page of a page is the owning page of its parent block
+        parent_ids = [page['parent_id'] for page in pages.values() if page['parent_id']]
+        parents = owning_pages(conn, parent_ids)
+        for page in pages.values():
+            page['parent_page'] = parents.get(page['parent_id'])
+
+        def path_of(page_id):
+            parts = []
+            seen = set()
+            current = page_id
+            while current in pages and current not in seen:
+                seen.add(current)
+                parts.append(_safe_name(pages[current]['title'], current))
+                if current == root_id:
+                    return os.path.join(*reversed(parts))
+                current = pages[current]['parent_page']
+            # Outside the requested subtree
+            if root_id:
+                return None
+            return os.path.join(*reversed(parts))
+
+        result = []
+        for page in pages.values():
+            path = path_of(page['id'])
+            if path is None:
+                continue
+            page['path'] = path + ".md"
+            result.append(page)
+        return result
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _remove_stale(self, relative_path):
+        """Delete a file a page is no longer exported to, and directories left empty"""
+        path = os.path.join(self.output_dir, relative_path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        root = os.path.abspath(self.output_dir)
+        directory = os.path.dirname(os.path.abspath(path))
+        while directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def _alive_pages(self, page_ids):
+        """The ids among page_ids that are still alive pages, in any space"""
+        conn = self.connection.connection()
+        return {row[0] for row in conn.execute(f"""
+            SELECT id FROM block
+            WHERE id IN (SELECT value FROM json_each(?))
+              AND alive = 1 AND type IN ({', '.join('?' * len(PAGE_TYPES))})
+        """, (json.dumps(page_ids), *PAGE_TYPES))}
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self.output_dir, MANIFEST_NAME)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(f"{path}.tmp", path)
+
+    def export(self, space_id=None, root_id=None, workers=None, force=False, debug=False, progress=None,
+               comments=False):
+        """Export pages to Markdown files
+
+        Args:
+            space_id (str): Only pages of this space
+            root_id (str): Only this page and the pages beneath it
+            workers (int): Worker processes, defaults to the CPU count
+            force (bool): Export pages even if unchanged since the manifest;
+                files of earlier exports are still cleaned up
+            debug (bool): Render in debug mode
+            progress (callable): Called with (done, total) as pages finish
+            comments (bool): Render comment threads beneath their blocks;
+                pages exported with the other setting are exported again
+
+        Returns:
+            dict: pages, skipped, removed, blocks and seconds
+        """
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self._load_manifest()
+
+        tasks = []
+        skipped = 0
+        pages = {}
+        for page in self.get_pages(space_id=space_id, root_id=root_id):
+            pages[page['id']] = page
+            previous = manifest.get(page['id'])
+            path = os.path.join(self.output_dir, page['path'])
+            if (not force and previous and previous['last_edited_time'] == page['last_edited_time']
+                    and previous['path'] == page['path'] and previous.get('comments', False) == comments
+                    and os.path.exists(path)):
+                skipped += 1
+                continue
+            tasks.append((page['id'], page['title'], path))
+
+        # A file is only removed if no page is exported to it now
+        paths = {page['path'] for page in pages.values()}
+
+        # Pages no longer listed are deleted, unless they are alive outside the exported scope
+        removed = 0
+        missing = [page_id for page_id in manifest if page_id not in pages]
+        alive = self._alive_pages(missing) if missing else set()
+        for page_id in missing:
+            if page_id not in alive:
+                if manifest[page_id]['path'] not in paths:
+                    self._remove_stale(manifest[page_id]['path'])
+                del manifest[page_id]
+                removed += 1
+
+        blocks = 0
+        done = 0
+        try:
+            if tasks:
+                workers = workers or os.cpu_count() or 1
+                batch_size = max(1, min(32, len(tasks) // (workers * 8)))
+                batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker,
+                                         initargs=(self.db_path, debug, comments)) as pool:
+                    for page_id, block_count in itertools.chain.from_iterable(pool.map(_export_pages, batches)):
+                        page = pages[page_id]
+                        # Renamed or moved: the new file is written, the old one goes
+                        previous = manifest.get(page_id)
+                        if previous and previous['path'] != page['path'] and previous['path'] not in paths:
+                            self._remove_stale(previous['path'])
+                        manifest[page_id] = {'last_edited_time': page['last_edited_time'], 'path': page['path']}
+                        if comments:
+                            manifest[page_id]['comments'] = True
+                        blocks += block_count
+                        done += 1
+                        # Persist progress so an interrupted export resumes where it stopped
+                        if done % 500 == 0:
+                            self._save_manifest(manifest)
+                        if progress:
+                            progress(done, len(tasks))
+        finally:
+            # Also on failure, so pages already written are not exported again
+            self._save_manifest(manifest)
+
+        return {
+            'pages': done,
+            'skipped': skipped,
+            'removed': removed,
+            'blocks': blocks,
+            'seconds': time.perf_counter() - start,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Notion pages to a Markdown directory tree')
+    parser.add_argument('output_dir', help='Directory to write Markdown files to')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to export, e.g. a mirror synced by sqldb.py')
+    parser.add_argument('--space', help='Only export pages of this space ID')
+    parser.add_argument('--root', help='Only export this page and the pages beneath it')
+    parser.add_argument('-j', '--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Re-export pages even if unchanged')
+    parser.add_argument('--debug', action='store_true', help='Render in debug mode')
+    parser.add_argument('--comments', action='store_true', help='Render comment threads beneath their blocks')
+    args = parser.parse_args()
+
+    exporter = NotionExporter(os.path.expanduser(args.db), args.output_dir)
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f"\r{done}/{total} pages", end='', file=sys.stderr, flush=True)
+
+    stats = exporter.export(space_id=args.space, root_id=args.root, workers=args.workers,
+                            force=args.force, debug=args.debug, progress=progress, comments=args.comments)
+    if stats['pages']:
+        print(file=sys.stderr)
+
+    seconds = stats['seconds']
+    print(f"Exported {stats['pages']} pages ({stats['blocks']} blocks), skipped {stats['skipped']} unchanged, "
+          f"removed {stats['removed']} deleted, "
+          f"in {seconds:.2f}s ({stats['pages'] / seconds if seconds else 0:.1f} pages/s, "
+          f"{stats['blocks'] / seconds if seconds else 0:.0f} blocks/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import sqlite3
+import json
+import os
+import random
+import uuid
+import argparse
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.md')
+
+# Non-automatic indexes of the Notion app whose columns are known
+INDEXES = {
+    'block_parent_id': ('block', ['parent_id']),
+    'transactions_user_id': ('transactions', ['user_id']),
+    'idx_offline_action_impacted_page_id': ('offline_action', ['impacted_page_id']),
+    'idx_offline_action_origin_page_id': ('offline_action', ['origin_page_id']),
+    'offline_page_download_status_index': ('offline_page', ['download_status']),
+    'offline_page_type_index': ('offline_page', ['type']),
+}
+
+CONSTRAINT_WORDS = ('PRIMARY', 'NOT', 'DEFAULT')
+
+# Leaf text blocks and their relative weights
+TEXT_TYPES = [
+    ('text', 40), ('bulleted_list_item', 15), ('numbered_list_item', 8), ('to_do', 5),
+    ('header', 3), ('sub_header', 4), ('sub_sub_header', 3), ('quote', 3), ('callout', 2),
+    ('code', 3), ('toggle', 6),
+]
+# Types that may have children
+CONTAINER_TYPES = ('toggle', 'bulleted_list_item', 'numbered_list_item', 'to_do', 'text', 'callout', 'quote')
+
+WORDS = ("notion block page markdown sqlite render export index search cache query "
+         "格式 內容 頁面 標題 段落 列表 表格").split()
+
+
+def load_schema(schema_path=SCHEMA_PATH):
+    """Parse the table layout dumped by NotionSchemaReader.print_schema
+
+    Args:
+        schema_path (str): Path to schema.md
+
+    Returns:
+        dict: Table name -> list of (column, type, constraints)
+    """
+    tables = {}
+    table = None
+    section = None
+    with open(schema_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('表名: '):
+                table = line[len('表名: '):].strip()
+                tables[table] = []
+                section = None
+            elif line.startswith('列定義'):
+                section = 'columns'
+            elif line.endswith(':') and not line.startswith('-'):
+                section = None
+            elif section == 'columns' and line.startswith('- '):
+                parts = line[2:].split()
+                name = parts[0]
+                rest = parts[1:]
+                type_ = ''
+                if rest and rest[0] not in CONSTRAINT_WORDS:
+                    type_ = rest.pop(0)
+                tables[table].append((name, type_, ' '.join(rest)))
+    return tables
+
+
+def create_tables(conn, schema):
+    """Create every non-internal table of the schema, with the app's indexes"""
+    for table, columns in schema.items():
+        if table.startswith('sqlite_'):
+            continue
+        definitions = []
+        primary_key = []
+        for name, type_, constraints in columns:
+            if 'PRIMARY KEY' in constraints:
+                primary_key.append(name)
+                constraints = constraints.replace('PRIMARY KEY', '').strip()
+            definitions.append(f'"{name}" {type_} {constraints}'.strip())
+        if primary_key:
+            definitions.append(f"PRIMARY KEY ({', '.join(primary_key)})")
+        conn.execute(f'CREATE TABLE "{table}" ({", ".join(definitions)})')
+
+    for name, (table, columns) in INDEXES.items():
+        if table in schema:
+            conn.execute(f'CREATE INDEX "{name}" ON "{table}" ({", ".join(columns)})')
+
+
+class FixtureBuilder:
+    """Builds a synthetic notion.db with the Notion app's table layout
+
+    Each page holds one large container toggle plus many smaller level-1
+    subtrees, all of bounded depth and fan-out, rich text
+    with a configurable share of annotated segments, and a share of dead
+    (alive = 0) blocks. Everything is seeded, so the same arguments always
+    produce the same database.
+    """
+
+    def __init__(self, pages=10, blocks_per_page=200, depth=6, fanout=8, rich_text_density=0.3,
+                 dead_share=0.05, users=5, seed=0):
+        """Initialise FixtureBuilder
+
+        Args:
+            pages (int): Number of top-level pages
+            blocks_per_page (int): Blocks generated under each page
+            depth (int): Maximum nesting depth below the page
+            fanout (int): Maximum children per block
+            rich_text_density (float): Share of text segments carrying annotations
+            dead_share (float): Share of blocks with alive = 0
+            users (int): Number of notion_user rows
+            seed (int): Random seed
+        """
+        self.pages = pages
+        self.blocks_per_page = blocks_per_page
+        self.depth = depth
+        self.fanout = fanout
+        self.rich_text_density = rich_text_density
+        self.dead_share = dead_share
+        self.users = users
+        self.random = random.Random(seed)
+        self.clock = 1600000000000
+
+    def _id(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def _time(self):
+        self.clock += self.random.randint(1, 60000)
+        return float(self.clock)
+
+    def _rich_text(self):
+        segments = []
+        for _ in range(self.random.randint(1, 4)):
+            text = " ".join(self.random.choice(WORDS) for _ in range(self.random.randint(1, 8))) + " "
+            if self.random.random() < self.rich_text_density:
+                fmt = self.random.choice([[['b']], [['i']], [['c']], [['s']], [['a', 'https://example.com/']],
+                                          [['b'], ['a', 'https://example.com/x']]])
+                segments.append([text, fmt])
+            else:
+                segments.append([text])
+        return segments
+
+    def _block_row(self, block_id, block_type, parent_id, parent_table, properties, content):
+        created = self._time()
+        return {
+            'id': block_id,
+            'space_id': self.space_id,
+            'version': float(self.random.randint(1, 100)),
+            'type': block_type,
+            'properties': json.dumps(properties, ensure_ascii=False) if properties is not None else None,
+            'content': json.dumps(content) if content else None,
+            'created_time': created,
+            'last_edited_time': created + self.random.randint(0, 10 ** 7),
+            'parent_id': parent_id,
+            'parent_table': parent_table,
+            'alive': 0 if self.random.random() < self.dead_share else 1,
+            'created_by_table': 'notion_user',
+            'created_by_id': self.random.choice(self.user_ids),
+            'last_edited_by_table': 'notion_user',
+            'last_edited_by_id': self.random.choice(self.user_ids),
+            'meta_user_id': self.user_ids[0],
+            'meta_last_access_timestamp': created,
+            'meta_role': 'editor',
+        }
+
+    def _page_tree(self, page_id):
+        """Generate the blocks of one page, growing each level-1 block depth-first
+
+        Returns:
+            tuple: (list of block rows without the page, content of the page,
+                    id of the container toggle)
+        """
+        rows = []
+        children = {page_id: []}
+        types = {}
+        budget = self.blocks_per_page
+        names, weights = zip(*TEXT_TYPES)
+
+        def new_block(parent_id):
+            block_id = self._id()
+            block_type = self.random.choices(names, weights)[0]
+            roll = self.random.random()
+            if roll < 0.04:
+                block_type = 'divider'
+            elif roll < 0.07:
+                block_type = 'image'
+            elif roll < 0.09:
+                block_type = 'table'
+            children[parent_id].append(block_id)
+            children[block_id] = []
+            types[block_id] = block_type
+            return block_id
+
+        # The first level-1 block is a toggle holding half of the page, filled
+        # breadth-first at full fan-out, so there is a large subtree to fetch
+        container_id = new_block(page_id)
+        types[container_id] = 'toggle'
+        budget -= 1
+        queue = [(container_id, 1)]
+        container_budget = budget // 2
+        while queue and container_budget > 0:
+            block_id, level = queue.pop(0)
+            if level >= self.depth:
+                continue
+            for _ in range(min(self.fanout, container_budget)):
+                queue.append((new_block(block_id), level + 1))
+                container_budget -= 1
+                budget -= 1
+
+        # Level-1 blocks until the budget is spent, each growing a subtree depth-first
+        while budget > 0:
+            stack = [(new_block(page_id), 1)]
+            budget -= 1
+            while stack and budget > 0:
+                block_id, level = stack.pop()
+                # Most blocks outside the container are leaves
+                if types[block_id] not in CONTAINER_TYPES or level >= self.depth or self.random.random() > 0.3:
+                    continue
+                for _ in range(min(self.random.randint(1, self.fanout), budget)):
+                    stack.append((new_block(block_id), level + 1))
+                    budget -= 1
+
+        parents = {child: parent for parent, kids in children.items() for child in kids}
+        for block_id, block_type in types.items():
+            properties = None
+            if block_type == 'image':
+                properties = {'source': [[f"https://example.com/{block_id}.png"]]}
+            elif block_type == 'table':
+                for _ in range(self.random.randint(1, 4)):
+                    row_id = self._id()
+                    children[block_id].append(row_id)
+                    rows.append(self._block_row(row_id, 'table_row', block_id, 'block',
+                                                {self._id()[:4]: self._rich_text() for _ in range(3)}, None))
+            elif block_type != 'divider':
+                properties = {'title': self._rich_text()}
+            rows.append(self._block_row(block_id, block_type, parents[block_id], 'block', properties,
+                                        children[block_id]))
+
+        return rows, children[page_id], container_id
+
+    def build(self, path):
+        """Write the fixture database
+
+        Args:
+            path (str): Database file to create, replaced if it exists
+
+        Returns:
+            dict: page_ids, container_ids (the container toggle of each page),
+                  space_id, user_ids and block_count
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        try:
+            schema = load_schema()
+            create_tables(conn, schema)
+            columns = [name for name, _, _ in schema['block']]
+
+            self.user_ids = [self._id() for _ in range(self.users)]
+            self.space_id = self._id()
+            for i, user_id in enumerate(self.user_ids):
+                conn.execute("""
+                    INSERT INTO notion_user (id, version, email, given_name, name, meta_user_id, meta_role)
+                    VALUES (?, 1, ?, ?, ?, ?, 'editor')
+                """, (user_id, f"user{i}@example.com", f"User{i}", f"User {i}", self.user_ids[0]))
+
+            page_ids = []
+            container_ids = []
+            block_count = 0
+            for p in range(self.pages):
+                page_id = self._id()
+                rows, content, container_id = self._page_tree(page_id)
+                page = self._block_row(page_id, 'page', self.space_id, 'space', {'title': [[f"Page {p}"]]}, content)
+                page['alive'] = 1
+                rows.append(page)
+                conn.executemany(
+                    f"INSERT INTO block ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(row.get(column) for column in columns) for row in rows],
+                )
+                page_ids.append(page_id)
+                container_ids.append(container_id)
+                block_count += len(rows)
+
+            conn.execute("""
+                INSERT INTO space (id, version, name, created_time, meta_user_id, pages)
+                VALUES (?, 1, 'Fixture', ?, ?, ?)
+            """, (self.space_id, float(self.clock), self.user_ids[0], json.dumps(page_ids)))
+            conn.commit()
+            return {
+                'page_ids': page_ids,
+                'container_ids': container_ids,
+                'space_id': self.space_id,
+                'user_ids': self.user_ids,
+                'block_count': block_count,
+            }
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic notion.db')
+    parser.add_argument('path', help='Database file to create')
+    parser.add_argument('--pages', type=int, default=10, help='Number of top-level pages')
+    parser.add_argument('--blocks', type=int, default=200, help='Blocks per page')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum nesting depth')
+    parser.add_argument('--fanout', type=int, default=8, help='Maximum children per block')
+    parser.add_argument('--rich-text', type=float, default=0.3, help='Share of annotated text segments')
+    parser.add_argument('--dead', type=float, default=0.05, help='Share of dead blocks')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    builder = FixtureBuilder(pages=args.pages, blocks_per_page=args.blocks, depth=args.depth, fanout=args.fanout,
+                             rich_text_density=args.rich_text, dead_share=args.dead, seed=args.seed)
+    info = builder.build(args.path)
+    print(f"Wrote {info['block_count']} blocks in {len(info['page_ids'])} pages to {args.path}")
+    print(f"First page: {info['page_ids'][0]}")
+
+
+if __name__ == "__main__":
+    main()
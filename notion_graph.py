@@ -0,0 +1,584 @@
+import sqlite3
+import json
+import mmap
+import os
+import struct
+import sys
+import argparse
+from array import array
+
+from notion_connection import database_uri, shared_connection
+from notion_markdown import plain_text
+from notion_page_reader import PAGE_TYPES
+
+SAVE_MAGIC = b'NGRAPH1\n'
+
+# Per-node arrays of a graph and their typecodes; None means the typecode is
+# picked from the number of categories (see _code_array)
+NODE_ARRAYS = {
+    'id_offsets': 'i',
+    'ids': 'B',
+    'rowids': 'q',
+    'parents': 'i',
+    'parent_tables': None,
+    'types': None,
+    'created_by': None,
+    'last_edited_by': None,
+    'created_time': 'd',
+    'last_edited_time': 'd',
+    'alive': 'b',
+    'child_offsets': 'i',
+    'children': 'i',
+}
+
+
+class _Categories:
+    """Interns repeated strings (types, users) as small consecutive codes, None as -1"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {None: -1}
+
+    def __call__(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _code_array(codes, count):
+    """Narrowest signed array holding codes below count"""
+    typecode = 'b' if count < 0x80 else 'h' if count < 0x8000 else 'i'
+    return codes if codes.typecode == typecode else array(typecode, codes)
+
+
+class WorkspaceGraph:
+    """Block tree of a whole workspace in flat arrays
+
+    Every distinct block is a node numbered 0..n-1 in block ID order, so an
+    ID is found by binary search over the packed IDs without a dict. Per node
+    the graph keeps the parent node (-1 when the parent is not a block in the
+    database), the parent table, type and author codes, the timestamps and
+    the rowid of the block's row. Children are stored CSR-style: the children
+    of node i are children[child_offsets[i]:child_offsets[i + 1]], in rowid
+    order like the hierarchy index. Text is not loaded; text() and texts()
+    read titles from the database by rowid when they are asked for.
+
+    A node costs roughly 90 bytes whatever its content, against several KB
+    for a row of Python dicts. save() writes the raw buffers and load() maps
+    them read-only with mmap, so reopening a saved graph does no parsing and
+    pages are read from disk only when touched.
+    """
+
+    def __init__(self, arrays, types, users, parent_tables, db_path=None, buffer=None):
+        """Initialise WorkspaceGraph
+
+        Args:
+            arrays (dict): Name -> array or memoryview, see NODE_ARRAYS
+            types (list): Block type of each type code
+            users (list): User ID of each created_by / last_edited_by code
+            parent_tables (list): Parent table of each parent table code
+            db_path (str): Database the graph was read from, for text()
+            buffer (mmap): Mapped file the arrays are views of
+        """
+        self.arrays = arrays
+        for name in NODE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.type_names = types
+        self.users = users
+        self.parent_table_names = parent_tables
+        self.db_path = db_path
+        self._buffer = buffer
+        self._order = None
+        self._depths = None
+        self._owners = None
+
+    def __len__(self):
+        return len(self.parents)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the node and edge arrays"""
+        return sum(len(values) * values.itemsize for values in self.arrays.values())
+
+    def index(self, block_id):
+        """Node of a block ID
+
+        Raises:
+            KeyError: The block is not in the graph
+        """
+        key = block_id.encode('utf-8')
+        ids, offsets = self.ids, self.id_offsets
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(ids[offsets[middle]:offsets[middle + 1]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and bytes(ids[offsets[low]:offsets[low + 1]]) == key:
+            return low
+        raise KeyError(block_id)
+
+    def block_id(self, node):
+        """Block ID of a node"""
+        return bytes(self.ids[self.id_offsets[node]:self.id_offsets[node + 1]]).decode('utf-8')
+
+    def type(self, node):
+        """Block type of a node"""
+        code = self.types[node]
+        return self.type_names[code] if code >= 0 else None
+
+    def parent_table(self, node):
+        code = self.parent_tables[node]
+        return self.parent_table_names[code] if code >= 0 else None
+
+    def parent(self, node):
+        """Parent node, -1 when the parent is a space, a collection or missing"""
+        return self.parents[node]
+
+    def child_nodes(self, node):
+        """Children of a node in rowid order"""
+        return self.children[self.child_offsets[node]:self.child_offsets[node + 1]].tolist()
+
+    def ancestors(self, node):
+        """Ancestor nodes, from the parent up to the top of the tree
+
+        A parent cycle is followed once round and stops before repeating a
+        node, whether or not the cycle passes through node itself.
+        """
+        parents = self.parents
+        chain = []
+        seen = {node}
+        parent = parents[node]
+        while parent >= 0 and parent not in seen:
+            seen.add(parent)
+            chain.append(parent)
+            parent = parents[parent]
+        return chain
+
+    def subtree(self, node, max_depth=None):
+        """Nodes below a node in depth-first order, children in rowid order
+
+        Args:
+            node (int): Top node, included first
+            max_depth (int): Deepest level below node to include
+
+        Returns:
+            array: Nodes, as an array of ints
+        """
+        children, offsets = self.children, self.child_offsets
+        result = array('i')
+        stack = [(node, 0)]
+        while stack:
+            current, depth = stack.pop()
+            result.append(current)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            # Each node has one parent, so only a cycle through node leads back to it
+            stack.extend((child, depth + 1) for child in reversed(children[offsets[current]:offsets[current + 1]])
+                         if child != node)
+        return result
+
+    def _walk(self):
+        """Nodes reachable from a top node, parents before children, with their depths
+
+        Nodes on a parent cycle are not reachable and keep depth -1.
+        """
+        if self._order is None:
+            parents, children, offsets = self.parents, self.children, self.child_offsets
+            depths = array('i', [-1]) * len(parents)
+            order = array('i', (node for node in range(len(parents)) if parents[node] < 0))
+            for node in order:
+                depths[node] = 0
+            position = 0
+            while position < len(order):
+                node = order[position]
+                depth = depths[node] + 1
+                for child in children[offsets[node]:offsets[node + 1]]:
+                    depths[child] = depth
+                    order.append(child)
+                position += 1
+            self._order, self._depths = order, depths
+        return self._order, self._depths
+
+    def depths(self):
+        """Depth of every node below the top of its tree, -1 on parent cycles
+
+        Returns:
+            array: Depth per node
+        """
+        return self._walk()[1]
+
+    def depth_histogram(self, node=None):
+        """Number of nodes at each depth
+
+        Args:
+            node (int): Count the subtree of this node, by depth below it,
+                instead of the whole graph
+
+        Returns:
+            dict: Depth -> number of nodes, in depth order; -1 counts nodes
+                  on parent cycles
+        """
+        histogram = {}
+        if node is None:
+            for depth in self.depths():
+                histogram[depth] = histogram.get(depth, 0) + 1
+        else:
+            depths = self.depths()
+            base = depths[node]
+            for member in self.subtree(node):
+                depth = depths[member] - base if base >= 0 else -1
+                histogram[depth] = histogram.get(depth, 0) + 1
+        return dict(sorted(histogram.items()))
+
+    def orphans(self):
+        """Nodes whose parent is a block missing from the database
+
+        Returns:
+            list: Nodes
+        """
+        block = self.parent_table_names.index('block') if 'block' in self.parent_table_names else None
+        if block is None:
+            return []
+        parents, parent_tables = self.parents, self.parent_tables
+        return [node for node in range(len(parents)) if parents[node] < 0 and parent_tables[node] == block]
+
+    def owners(self):
+        """Owning page of every node: the node itself for a page, else its parent's owner
+
+        Returns:
+            array: Page node per node, -1 when no page lies above it
+        """
+        if self._owners is None:
+            order, _ = self._walk()
+            parents, types = self.parents, self.types
+            pages = {code for code, name in enumerate(self.type_names) if name in PAGE_TYPES}
+            owners = array('i', [-1]) * len(parents)
+            for node in order:
+                if types[node] in pages:
+                    owners[node] = node
+                elif parents[node] >= 0:
+                    owners[node] = owners[parents[node]]
+            self._owners = owners
+        return self._owners
+
+    def page_sizes(self):
+        """Blocks on each page, not counting the page block or its child pages' blocks
+
+        Returns:
+            dict: Page node -> number of blocks, for every page
+        """
+        owners = self.owners()
+        sizes = {node: 0 for node in range(len(owners)) if owners[node] == node}
+        for node, owner in enumerate(owners):
+            if owner >= 0 and owner != node:
+                sizes[owner] += 1
+        return sizes
+
+    def authorship(self, field='created_by', nodes=None):
+        """Number of blocks per user
+
+        Args:
+            field (str): 'created_by' or 'last_edited_by'
+            nodes (iterable): Count only these nodes
+
+        Returns:
+            dict: User ID -> number of blocks, most blocks first; None counts
+                  blocks without a user
+        """
+        codes = getattr(self, field)
+        counts = {}
+        for code in (codes if nodes is None else map(codes.__getitem__, nodes)):
+            counts[code] = counts.get(code, 0) + 1
+        return {self.users[code] if code >= 0 else None: count
+                for code, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)}
+
+    def texts(self, nodes):
+        """Plain-text titles of nodes, read from the database by rowid
+
+        A row whose rowid no longer holds the same block (e.g. after VACUUM)
+        is looked up by ID instead.
+
+        Args:
+            nodes (list): Nodes
+
+        Returns:
+            dict: Node -> title, empty for blocks without one
+        """
+        if self.db_path is None:
+            raise Exception("Graph has no database to read text from")
+        nodes = list(nodes)
+        conn = shared_connection(self.db_path).connection()
+        try:
+            rows = {rowid: (block_id, properties) for rowid, block_id, properties in conn.execute("""
+                SELECT block.rowid, block.id, block.properties
+                FROM json_each(?) rowids
+                INNER JOIN block ON block.rowid = rowids.value
+            """, (json.dumps([self.rowids[node] for node in nodes]),))}
+            texts = {}
+            for node in nodes:
+                block_id, properties = rows.get(self.rowids[node], (None, None))
+                if block_id != self.block_id(node):
+                    row = conn.execute("SELECT properties FROM block WHERE id = ? LIMIT 1",
+                                       (self.block_id(node),)).fetchone()
+                    properties = row[0] if row else None
+                texts[node] = _title(properties)
+            return texts
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading block text: {e}")
+
+    def text(self, node):
+        """Plain-text title of a node, read from the database"""
+        return self.texts([node])[node]
+
+    def save(self, path):
+        """Write the graph to a file that load() maps without parsing
+
+        The file holds a JSON header with the categories and the position of
+        each array, followed by the raw array buffers aligned to 8 bytes.
+
+        Args:
+            path (str): File to write
+        """
+        entries = []
+        offset = 0
+        for name in NODE_ARRAYS:
+            values = self.arrays[name]
+            offset = (offset + 7) & ~7
+            size = len(values) * values.itemsize
+            entries.append({'name': name, 'typecode': values.format if isinstance(values, memoryview)
+                            else values.typecode, 'offset': offset, 'size': size})
+            offset += size
+        header = {
+            'byteorder': sys.byteorder,
+            'db_path': self.db_path,
+            'types': self.type_names,
+            'users': self.users,
+            'parent_tables': self.parent_table_names,
+            'arrays': entries,
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        start = (len(SAVE_MAGIC) + 8 + len(header_bytes) + 7) & ~7
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(SAVE_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for entry in entries:
+                f.write(b'\0' * (start + entry['offset'] - f.tell()))
+                f.write(self.arrays[entry['name']])
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Map a graph written by save
+
+        The arrays are read-only memoryviews of the mapped file; a file
+        written on a machine of the other byte order is copied and swapped.
+
+        Args:
+            path (str): File to read
+
+        Returns:
+            WorkspaceGraph: The saved graph
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(SAVE_MAGIC)) != SAVE_MAGIC:
+                raise ValueError(f"Not a workspace graph file: {path}")
+            (header_size,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size).decode('utf-8'))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start = (len(SAVE_MAGIC) + 8 + header_size + 7) & ~7
+        view = memoryview(buffer)
+        arrays = {}
+        for entry in header['arrays']:
+            data = view[start + entry['offset']:start + entry['offset'] + entry['size']]
+            if header['byteorder'] != sys.byteorder and entry['typecode'] not in ('b', 'B'):
+                values = array(entry['typecode'])
+                values.frombytes(data)
+                values.byteswap()
+                arrays[entry['name']] = values
+            else:
+                arrays[entry['name']] = data.cast(entry['typecode'])
+        return cls(arrays, header['types'], header['users'], header['parent_tables'],
+                   db_path=header.get('db_path'), buffer=buffer)
+
+    def close(self):
+        """Unmap the file of a loaded graph; the graph is unusable afterwards"""
+        if self._buffer is None:
+            return
+        for values in self.arrays.values():
+            if isinstance(values, memoryview):
+                values.release()
+        self.arrays = {}
+        self._buffer.close()
+        self._buffer = None
+
+
+def _title(properties):
+    if not properties:
+        return ""
+    try:
+        properties = json.loads(properties)
+    except (TypeError, json.JSONDecodeError):
+        return ""
+    return plain_text(properties.get('title')) if isinstance(properties, dict) else ""
+
+
+class NotionGraphReader:
+    def __init__(self, db_path):
+        """Initialise NotionGraphReader
+
+        Args:
+            db_path (str): Path to the Notion database file
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+        self.db_path = db_path
+
+    def load(self):
+        """Read the block tree of every block into a WorkspaceGraph
+
+        Block IDs are numbered in ID order by SQLite in a temporary table,
+        which also resolves parent IDs to nodes. The block table is then read
+        once in rowid order, the order its pages lie on disk, and each row
+        is written into its node's slot of preallocated arrays, so Python
+        never holds a row per block. A block cached once per meta_user_id
+        becomes one node, from its first row.
+
+        Returns:
+            WorkspaceGraph: The graph, with arrays in memory
+        """
+        # A private connection: the temporary table must not outlive the load
+        conn = sqlite3.connect(database_uri(self.db_path), uri=True)
+        try:
+            # Keyed by the rowid of each block's first row; the other rows of a block find no node
+            conn.execute("CREATE TEMP TABLE graph_node (row INTEGER PRIMARY KEY, node INTEGER NOT NULL, id TEXT NOT NULL)")
+            conn.execute("""
+                INSERT INTO graph_node (row, node, id)
+                SELECT min(rowid), row_number() OVER (ORDER BY id) - 1, id
+                FROM block
+                GROUP BY id
+                ORDER BY 1
+            """)
+            conn.execute("CREATE UNIQUE INDEX temp.graph_node_id ON graph_node (id, node)")
+
+            id_offsets = array('i', [0])
+            ids = bytearray()
+            for (block_id,) in conn.execute("SELECT id FROM graph_node ORDER BY node"):
+                ids += block_id.encode('utf-8')
+                id_offsets.append(len(ids))
+
+            count = len(id_offsets) - 1
+            rowids = array('q', [0]) * count
+            parents = array('i', [-1]) * count
+            parent_tables = array('i', [-1]) * count
+            types = array('i', [-1]) * count
+            created_by = array('i', [-1]) * count
+            last_edited_by = array('i', [-1]) * count
+            created_time = array('d', [float('nan')]) * count
+            last_edited_time = array('d', [float('nan')]) * count
+            alive = array('b', [0]) * count
+            # Nodes in rowid order, the sibling order of the children
+            by_rowid = array('i')
+            type_codes, user_codes, table_codes = _Categories(), _Categories(), _Categories()
+
+            for (node, rowid, parent, parent_table, block_type, creator, editor, created, edited,
+                 is_alive) in conn.execute("""
+                SELECT n.node, b.rowid, p.node, b.parent_table, b.type, b.created_by_id, b.last_edited_by_id,
+                       b.created_time, b.last_edited_time, b.alive
+                FROM block b
+                CROSS JOIN graph_node n ON n.row = b.rowid
+                LEFT JOIN graph_node p ON p.id = b.parent_id AND b.parent_table = 'block'
+            """):
+                by_rowid.append(node)
+                rowids[node] = rowid
+                if parent is not None:
+                    parents[node] = parent
+                parent_tables[node] = table_codes(parent_table)
+                types[node] = type_codes(block_type)
+                created_by[node] = user_codes(creator)
+                last_edited_by[node] = user_codes(editor)
+                if created is not None:
+                    created_time[node] = created
+                if edited is not None:
+                    last_edited_time[node] = edited
+                alive[node] = 1 if is_alive else 0
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading Notion database: {e}")
+        finally:
+            conn.close()
+
+        # CSR children: count per parent, then place each child in rowid order
+        child_offsets = array('i', [0]) * (count + 1)
+        for parent in parents:
+            if parent >= 0:
+                child_offsets[parent + 1] += 1
+        for node in range(count):
+            child_offsets[node + 1] += child_offsets[node]
+        children = array('i', [0]) * child_offsets[-1]
+        positions = array('i', child_offsets)
+        for node in by_rowid:
+            parent = parents[node]
+            if parent >= 0:
+                children[positions[parent]] = node
+                positions[parent] += 1
+
+        arrays = {
+            'id_offsets': id_offsets,
+            'ids': array('B', ids),
+            'rowids': rowids,
+            'parents': parents,
+            'parent_tables': _code_array(parent_tables, len(table_codes.values)),
+            'types': _code_array(types, len(type_codes.values)),
+            'created_by': _code_array(created_by, len(user_codes.values)),
+            'last_edited_by': _code_array(last_edited_by, len(user_codes.values)),
+            'created_time': created_time,
+            'last_edited_time': last_edited_time,
+            'alive': alive,
+            'child_offsets': child_offsets,
+            'children': children,
+        }
+        return WorkspaceGraph(arrays, type_codes.values, user_codes.values, table_codes.values,
+                              db_path=os.path.abspath(self.db_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load the block tree of a Notion workspace into compact arrays')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to read, e.g. a mirror synced by sqldb.py')
+    parser.add_argument('--graph', help='Open a graph file written by --save instead of reading the database')
+    parser.add_argument('--save', help='Write the graph to this file')
+    parser.add_argument('--top', type=int, default=10, help='Number of largest pages and authors listed')
+    args = parser.parse_args()
+
+    if args.graph:
+        graph = WorkspaceGraph.load(args.graph)
+    else:
+        graph = NotionGraphReader(os.path.expanduser(args.db)).load()
+    if args.save:
+        graph.save(args.save)
+
+    print(f"{len(graph)} blocks, {len(graph.children)} parent links, {graph.nbytes} bytes")
+    print(f"Orphans: {len(graph.orphans())}")
+    print("Depths:")
+    for depth, count in graph.depth_histogram().items():
+        print(f"  {'cycle' if depth < 0 else depth:>5}  {count}")
+    sizes = sorted(graph.page_sizes().items(), key=lambda item: item[1], reverse=True)[:args.top]
+    if sizes:
+        print("Largest pages:")
+        titles = graph.texts([node for node, _ in sizes]) if graph.db_path and os.path.exists(graph.db_path) else {}
+        for node, size in sizes:
+            print(f"  {graph.block_id(node)}  {size:>8}  {titles.get(node, '')}")
+    print("Authors:")
+    for user_id, count in list(graph.authorship().items())[:args.top]:
+        print(f"  {user_id}  {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+import sqlite3
+import json
+import os
+import sys
+import threading
+import argparse
+from urllib.parse import quote
+
+from notion_block import Block
+from notion_connection import database_uri
+
+# Distance between consecutive interval ends after a (re)numbering; the gaps
+# let new and moved blocks be placed without renumbering their tree
+STRIDE = 1024.0
+# Smallest spacing used inside a gap before the tree is renumbered
+MIN_SPACING = 1e-6
+
+
+class NotionHierarchyIndex:
+    """Materialised closure of the block hierarchy, kept in a sidecar database
+
+    Every block reachable from the top of its tree gets a row with its
+    parent, the top block of its tree (root_id), its depth below that top,
+    its ancestor chain as a '/'-separated path and a pre/post-order interval
+    within the tree. A block's descendants are exactly the rows of its tree
+    whose pre lies inside its interval, so a subtree is one range scan on
+    (root_id, pre) and the root page and level of a block one point lookup.
+
+    Intervals are numbered STRIDE apart, leaving gaps in which update()
+    places new blocks and moved subtrees (an affine relabelling of the
+    subtree's interval) at their rowid position among their siblings,
+    without touching the rest of the tree. A tree is renumbered only when
+    a gap runs out of precision. A parent cycle is cut at one of its
+    blocks, which becomes the top of a tree that does not lead up to a
+    space.
+
+    update() follows last_edited_time like NotionSearchIndex; hard deletions
+    and moves that did not touch last_edited_time are caught by a full
+    update, which compares every block's parent with the index.
+    """
+
+    def __init__(self, db_path, index_path):
+        """Initialise NotionHierarchyIndex
+
+        Args:
+            db_path (str): Notion database (or mirror) to index
+            index_path (str): Sidecar index database, created if missing
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+        self.db_path = db_path
+        self.index_path = index_path
+        self._local = threading.local()
+
+    def _reader(self):
+        """This thread's connection for lookups, opened once and reused"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not os.path.exists(self.index_path):
+                raise Exception(f"Hierarchy index not found, run update() first: {self.index_path}")
+            conn = sqlite3.connect(database_uri(self.index_path), uri=True, check_same_thread=False)
+            conn.execute("ATTACH DATABASE ? AS src", (database_uri(self.db_path),))
+            self._local.conn = conn
+        return conn
+
+    def connect(self):
+        """Open the sidecar read-write with the Notion database attached read-only as src"""
+        try:
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.index_path))}", uri=True,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("ATTACH DATABASE ? AS src", (database_uri(self.db_path),))
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS block_tree (
+                    id TEXT PRIMARY KEY,
+                    parent_id TEXT,
+                    parent_table TEXT,
+                    root_id TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    pre REAL NOT NULL,
+                    post REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS block_tree_interval ON block_tree(root_id, pre)")
+            conn.execute("CREATE INDEX IF NOT EXISTS block_tree_parent ON block_tree(parent_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_state (
+                    key TEXT PRIMARY KEY,
+                    value
+                )
+            """)
+            return conn
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening hierarchy index: {e}")
+
+    def update(self, rebuild=False, full=False):
+        """Bring the index up to date with the Notion database
+
+        Args:
+            rebuild (bool): Drop the index and number every tree again
+            full (bool): Compare the parent of every block instead of only
+                blocks edited since the last update, and drop deleted blocks
+
+        Returns:
+            dict: {'indexed': int, 'moved': int, 'removed': int}
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN")
+            row = conn.execute("SELECT value FROM index_state WHERE key = 'watermark'").fetchone()
+            if rebuild or row is None:
+                stats = self._build(conn)
+            elif full:
+                stats = self._apply_full(conn)
+            else:
+                stats = self._apply_changes(conn, row[0])
+            conn.execute("""
+                INSERT OR REPLACE INTO index_state (key, value)
+                SELECT 'watermark', MAX(last_edited_time) FROM src.block
+            """)
+            conn.execute("COMMIT")
+            return stats
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            raise Exception(f"Error updating hierarchy index: {e}")
+        finally:
+            conn.close()
+
+    def _build(self, conn):
+        """Number every tree from scratch with one depth-first walk"""
+        conn.execute("DELETE FROM block_tree")
+        parents = {}
+        children = {}
+        # Children are numbered in rowid order, the order the parent_id index returns them
+        for block_id, parent_id, parent_table in conn.execute(
+                "SELECT id, parent_id, parent_table FROM src.block ORDER BY rowid"):
+            if block_id not in parents:
+                parents[block_id] = (parent_id, parent_table)
+        for block_id, (parent_id, _) in parents.items():
+            if parent_id in parents and parent_id != block_id:
+                children.setdefault(parent_id, []).append(block_id)
+
+        rows = []
+        visited = set()
+        tops = [block_id for block_id, (parent_id, _) in parents.items()
+                if parent_id not in parents or parent_id == block_id]
+        # Blocks left over are in parent cycles; each cycle is cut at its first block
+        for top in tops + list(parents):
+            if top in visited:
+                continue
+            visited.add(top)
+            counter = 0.0
+            pre = {top: counter}
+            # (block, depth, path, children left to visit)
+            stack = [(top, 0, "/", iter(children.get(top, ())))]
+            while stack:
+                block_id, depth, path, pending = stack[-1]
+                child = next(pending, None)
+                if child is None:
+                    stack.pop()
+                    counter += STRIDE
+                    parent_id, parent_table = parents[block_id]
+                    rows.append((block_id, parent_id, parent_table, top, depth, path, pre[block_id], counter))
+                    continue
+                if child in visited:
+                    continue
+                visited.add(child)
+                counter += STRIDE
+                pre[child] = counter
+                stack.append((child, depth + 1, f"{path}{block_id}/", iter(children.get(child, ()))))
+
+        conn.executemany("""
+            INSERT INTO block_tree (id, parent_id, parent_table, root_id, depth, path, pre, post)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        return {'indexed': len(rows), 'moved': 0, 'removed': 0}
+
+    def _apply_changes(self, conn, watermark):
+        """Re-place blocks edited since the watermark whose parent changed"""
+        rows = conn.execute("""
+            SELECT id, parent_id, parent_table
+            FROM src.block
+            WHERE last_edited_time >= ?
+            ORDER BY last_edited_time
+        """, (watermark if watermark is not None else float('-inf'),)).fetchall()
+        return self._apply(conn, rows, [])
+
+    def _apply_full(self, conn):
+        """Re-place every block whose parent differs from the index and drop deleted blocks"""
+        rows = conn.execute("""
+            SELECT b.id, b.parent_id, b.parent_table
+            FROM src.block b
+            LEFT JOIN block_tree t ON t.id = b.id
+            WHERE t.id IS NULL OR t.parent_id IS NOT b.parent_id OR t.parent_table IS NOT b.parent_table
+        """).fetchall()
+        deleted = [row[0] for row in conn.execute("""
+            SELECT id FROM block_tree
+            WHERE id NOT IN (SELECT id FROM src.block)
+        """)]
+        return self._apply(conn, rows, deleted)
+
+    def _apply(self, conn, changes, deleted):
+        stats = {'indexed': 0, 'moved': 0, 'removed': 0}
+        for block_id in deleted:
+            orphans = [row[0] for row in conn.execute("SELECT id FROM block_tree WHERE parent_id = ?", (block_id,))]
+            conn.execute("DELETE FROM block_tree WHERE id = ?", (block_id,))
+            stats['removed'] += 1
+            # Children of a deleted block become the tops of their own trees
+            for child in orphans:
+                self._place(conn, child, block_id, 'block', stats)
+
+        seen = set()
+        for block_id, parent_id, parent_table in changes:
+            if block_id in seen:
+                continue
+            seen.add(block_id)
+            current = conn.execute("SELECT parent_id, parent_table FROM block_tree WHERE id = ?",
+                                   (block_id,)).fetchone()
+            if current is None or current != (parent_id, parent_table):
+                self._place(conn, block_id, parent_id, parent_table, stats)
+        return stats
+
+    def _node(self, conn, block_id):
+        return conn.execute("SELECT root_id, depth, path, pre, post FROM block_tree WHERE id = ?",
+                            (block_id,)).fetchone()
+
+    def _place(self, conn, block_id, parent_id, parent_table, stats):
+        """Insert a block, or move it with its subtree, under its current parent
+
+        A block whose parent is not indexed, or that would become its own
+        ancestor, is the top of a tree of its own.
+        """
+        node = self._node(conn, block_id)
+        parent = self._node(conn, parent_id) if parent_id is not None and parent_id != block_id else None
+        if parent is not None and node is not None and parent[0] == node[0] and node[3] <= parent[3] <= node[4]:
+            parent = None
+
+        # Width of the interval being placed, in its current numbering
+        width = node[4] - node[3] if node is not None else STRIDE
+        if parent is None:
+            root_id, depth, path, low, scale = block_id, 0, "/", 0.0, 1.0
+        else:
+            low, high = self._gap(conn, block_id, parent_id, parent)
+            scale = min(1.0, (high - low) / (width + 2 * STRIDE))
+            if scale * STRIDE < MIN_SPACING or low + scale * STRIDE == low:
+                self._renumber(conn, parent[0])
+                parent = self._node(conn, parent_id)
+                if node is not None:
+                    node = self._node(conn, block_id)
+                    width = node[4] - node[3]
+                low, high = self._gap(conn, block_id, parent_id, parent)
+                scale = min(1.0, (high - low) / (width + 2 * STRIDE))
+            root_id, depth, path = parent[0], parent[1] + 1, f"{parent[2]}{parent_id}/"
+
+        if node is None:
+            conn.execute("""
+                INSERT INTO block_tree (id, parent_id, parent_table, root_id, depth, path, pre, post)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (block_id, parent_id, parent_table, root_id, depth, path,
+                  low + scale * STRIDE, low + scale * (STRIDE + width)))
+            stats['indexed'] += 1
+            # Blocks that arrived before this parent were tops of their own trees
+            for (child,) in conn.execute("SELECT id FROM block_tree WHERE parent_id = ? AND root_id = id",
+                                         (block_id,)).fetchall():
+                self._place(conn, child, block_id, 'block', stats)
+            return
+
+        old_root, old_depth, old_path, old_pre, old_post = node
+        conn.execute("""
+            UPDATE block_tree
+            SET pre = :low + (pre - :old_pre + :stride) * :scale,
+                post = :low + (post - :old_pre + :stride) * :scale,
+                depth = depth + :depth_change,
+                root_id = :root_id,
+                path = :path || substr(path, :cut)
+            WHERE root_id = :old_root AND pre >= :old_pre AND pre <= :old_post
+        """, {
+            'low': low, 'old_pre': old_pre, 'stride': STRIDE, 'scale': scale, 'depth_change': depth - old_depth,
+            'root_id': root_id, 'path': path, 'cut': len(old_path) + 1, 'old_root': old_root, 'old_post': old_post,
+        })
+        conn.execute("UPDATE block_tree SET parent_id = ?, parent_table = ? WHERE id = ?",
+                     (parent_id, parent_table, block_id))
+        stats['moved'] += 1
+
+    def _gap(self, conn, block_id, parent_id, parent):
+        """Free interval between the siblings before and after a block, as (low, high)
+
+        Siblings are ordered by the first rowid of their rows, as in _build
+        and the recursive CTE, so a placed block keeps its sibling position.
+        The unary + keeps SQLite on the parent_id index; the interval index
+        would scan the parent's whole subtree.
+        """
+        row = conn.execute("SELECT min(rowid) FROM src.block WHERE id = ?", (block_id,)).fetchone()[0]
+        before, after = conn.execute("""
+            SELECT MAX(CASE WHEN sibling.row < :row THEN sibling.post END),
+                   MIN(CASE WHEN sibling.row > :row THEN sibling.pre END)
+            FROM (
+                SELECT t.pre, t.post, (SELECT min(rowid) FROM src.block b WHERE b.id = t.id) AS row
+                FROM block_tree t
+                WHERE t.parent_id = :parent_id AND +t.root_id = :root_id AND +t.pre > :pre AND +t.pre < :post
+                      AND t.id != :id
+            ) sibling
+        """, {'row': row if row is not None else float('inf'), 'parent_id': parent_id, 'root_id': parent[0],
+              'pre': parent[3], 'post': parent[4], 'id': block_id}).fetchone()
+        return (before if before is not None else parent[3]), (after if after is not None else parent[4])
+
+    def _renumber(self, conn, root_id):
+        """Number one tree again STRIDE apart, keeping its order"""
+        rows = conn.execute("SELECT id, pre, post FROM block_tree WHERE root_id = ? ORDER BY pre",
+                            (root_id,)).fetchall()
+        numbers = {}
+        counter = -STRIDE
+        stack = []
+        for block_id, pre, post in rows:
+            while stack and stack[-1][1] < pre:
+                counter += STRIDE
+                numbers[stack.pop()[0]][1] = counter
+            counter += STRIDE
+            numbers[block_id] = [counter, None]
+            stack.append((block_id, post))
+        while stack:
+            counter += STRIDE
+            numbers[stack.pop()[0]][1] = counter
+        conn.executemany("UPDATE block_tree SET pre = ?, post = ? WHERE id = ?",
+                         [(pre, post, block_id) for block_id, (pre, post) in numbers.items()])
+
+    def get_page_blocks(self, page_id, max_depth=None):
+        """Get the blocks of a page with one range scan of the index
+
+        Same rows as NotionPageReader.get_page_blocks: a page returns its
+        direct children, any other block its whole subtree. Blocks come by
+        level, then in pre-order, which is the order of the recursive CTE:
+        children follow the position of their parent in the level above,
+        siblings in rowid order.
+
+        Args:
+            page_id (str): The page ID to get blocks for
+            max_depth (int): Deepest level to return, level 1 being the direct children
+
+        Returns:
+            list: List containing all page blocks
+        """
+        conn = self._reader()
+        try:
+            row = conn.execute("""
+                SELECT t.root_id, t.depth, t.pre, t.post, b.type
+                FROM block_tree t
+                INNER JOIN src.block b ON b.id = t.id
+                WHERE t.id = ?
+                LIMIT 1
+            """, (page_id,)).fetchone()
+            if row is None:
+                return []
+            root_id, depth, pre, post, page_type = row
+            if page_type == 'page':
+                max_depth = 1
+
+            cursor = conn.execute(f"""
+                SELECT
+                    b.id,
+                    b.parent_id,
+                    b.type,
+                    b.properties,
+                    b.content,
+                    b.version,
+                    b.created_time,
+                    b.created_by_id,
+                    u.name AS created_by_name,
+                    b.last_edited_time,
+                    b.last_edited_by_id,
+                    t.depth - ? AS level,
+                    b.alive
+                FROM block_tree t
+                INNER JOIN src.block b ON b.id = t.id
+                INNER JOIN src.notion_user u ON u.id = b.created_by_id
+                WHERE t.root_id = ? AND t.pre > ? AND t.pre < ? {"AND t.depth <= ?" if max_depth is not None else ""}
+                ORDER BY t.depth, t.pre
+            """, (depth, root_id, pre, post) + ((depth + max_depth,) if max_depth is not None else ()))
+            return Block.from_cursor(cursor)
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading hierarchy index: {e}")
+
+    def roots(self, block_ids):
+        """Root page and level of blocks, by point lookups in the index
+
+        Same result as NotionDatabaseReader._resolve_roots: the root is the
+        top block whose parent is the space, at level 1.
+
+        Args:
+            block_ids (list): Block IDs
+
+        Returns:
+            dict: Block ID -> (root_page_id, level), leaving out blocks that do
+                  not lead up to a space
+        """
+        conn = self._reader()
+        try:
+            rows = conn.execute("""
+                SELECT t.id, t.root_id, t.depth + 1
+                FROM json_each(?) ids
+                INNER JOIN block_tree t ON t.id = ids.value
+                INNER JOIN block_tree r ON r.id = t.root_id
+                WHERE r.parent_table = 'space'
+            """, (json.dumps(list(block_ids)),)).fetchall()
+            return {block_id: (root_id, level) for block_id, root_id, level in rows}
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading hierarchy index: {e}")
+
+    def ancestors(self, block_id):
+        """Ancestor chain of a block, from the top of its tree down to its parent
+
+        Returns:
+            list: Block IDs, empty for a top block or a block not indexed
+        """
+        row = self._reader().execute("SELECT path FROM block_tree WHERE id = ?", (block_id,)).fetchone()
+        return [ancestor for ancestor in row[0].split('/') if ancestor] if row else []
+
+    def close(self):
+        """Close this thread's lookup connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def check_against_reader(index, page_ids):
+    """Compare index fetches with the recursive CTE of NotionPageReader
+
+    For each page or container the rows, their levels and order, and the
+    rendered Markdown in debug and non-debug mode must be identical.
+
+    Args:
+        index (NotionHierarchyIndex): Up-to-date index
+        page_ids (list): Pages or other blocks to compare
+
+    Returns:
+        list: (page ID, what differs) per mismatch, empty when all match
+    """
+    from notion_page_reader import NotionPageReader
+
+    reader = NotionPageReader(index.db_path)
+    mismatches = []
+    for page_id in page_ids:
+        expected = reader.get_page_blocks(page_id) or []
+        actual = index.get_page_blocks(page_id)
+        if [(block['id'], block['level']) for block in expected] != [(block['id'], block['level']) for block in actual]:
+            mismatches.append((page_id, 'rows'))
+            continue
+        for debug in (False, True):
+            if list(reader.iter_page_markdown(expected, debug)) != list(reader.iter_page_markdown(actual, debug)):
+                mismatches.append((page_id, 'debug markdown' if debug else 'markdown'))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Materialised block hierarchy index for a Notion database')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to index, e.g. a mirror synced by sqldb.py')
+    parser.add_argument('--index', default="notion_hierarchy.db", help='Sidecar hierarchy index database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help='Bring the index up to date')
+    update_parser.add_argument('--rebuild', action='store_true', help='Rebuild the whole index')
+    update_parser.add_argument('--full', action='store_true', help='Compare every block instead of recent edits')
+    ancestors_parser = subparsers.add_parser('ancestors', help='Print the ancestors of a block')
+    ancestors_parser.add_argument('block_id', help='Block ID')
+    check_parser = subparsers.add_parser('check', help='Compare index fetches with the recursive query')
+    check_parser.add_argument('page_ids', nargs='+', help='Pages or other blocks to compare')
+    args = parser.parse_args()
+
+    index = NotionHierarchyIndex(os.path.expanduser(args.db), args.index)
+    if args.command == 'update':
+        stats = index.update(rebuild=args.rebuild, full=args.full)
+        print(f"Indexed {stats['indexed']} blocks, moved {stats['moved']}, removed {stats['removed']}")
+    elif args.command == 'check':
+        mismatches = check_against_reader(index, args.page_ids)
+        for page_id, what in mismatches:
+            print(f"{page_id}: {what} differ")
+        print(f"{len(args.page_ids) - len({page_id for page_id, _ in mismatches})}/{len(args.page_ids)} match")
+        if mismatches:
+            sys.exit(1)
+    else:
+        for ancestor in index.ancestors(args.block_id):
+            print(ancestor)
+
+
+if __name__ == "__main__":
+    main()
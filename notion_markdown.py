@@ -0,0 +1,327 @@
+import json
+import sys
+
+from notion_profile import register_hot_path
+
+# Bump whenever rendered output changes, so cached renders are not reused
+RENDER_VERSION = 3
+
+# Markdown prefix of each text block type
+TEXT_PREFIXES = {
+    'heading1': '# ',
+    'header': '# ',
+    'heading2': '## ',
+    'sub_header': '## ',
+    'heading3': '### ',
+    'sub_sub_header': '### ',
+    'bulleted_list_item': '- ',
+    'numbered_list_item': '1. ',
+    'to_do': '- [ ] ',
+    'toggle': '> ',
+    'quote': '> ',
+    'callout': '💡 ',
+}
+
+
+def _mention(text, fmt):
+    """Replace the ‣ (or ⁍ for equations) placeholder of a mention
+
+    Returns:
+        str: text with the page, user, date or equation written out
+    """
+    kind = fmt[0]
+    value = fmt[1] if len(fmt) > 1 else None
+    if value is None:
+        return text
+    if kind == 'p':
+        value = f"[{value}](https://www.notion.so/{str(value).replace('-', '')})"
+    elif kind == 'u':
+        value = f"@{value}"
+    elif kind == 'd':
+        if not isinstance(value, dict):
+            return text
+        start = " ".join(str(value[key]) for key in ('start_date', 'start_time') if value.get(key))
+        end = " ".join(str(value[key]) for key in ('end_date', 'end_time') if value.get(key))
+        value = f"@{start} → {end}" if end else f"@{start}"
+    elif kind == 'e':
+        value = f"${value}$"
+    for placeholder in ('‣', '⁍'):
+        if placeholder in text:
+            return text.replace(placeholder, value, 1)
+    return value
+
+
+# Inline annotations that wrap the text as (code, opening, closing marker),
+# innermost first; a link's URL follows its closing marker
+ANNOTATIONS = (
+    ('c', "`", "`"),
+    ('s', "~~", "~~"),
+    ('_', "<u>", "</u>"),
+    ('i', "*", "*"),
+    ('b', "**", "**"),
+    ('a', "[", "]("),
+)
+ANNOTATION_BITS = {code: 1 << i for i, (code, _, _) in enumerate(ANNOTATIONS)}
+LINK_BIT = ANNOTATION_BITS['a']
+# Annotations that stand for their text instead of wrapping it
+MENTIONS = frozenset(('p', 'u', 'd', 'e'))
+
+
+def _compile_markers(mask):
+    """Opening and closing markers of one combination of annotations"""
+    opening = closing = ""
+    for code, start, end in ANNOTATIONS:
+        if mask & ANNOTATION_BITS[code]:
+            opening = start + opening
+            closing = closing + end
+    return opening, closing
+
+
+# Markers of every combination, indexed by the bit mask of its annotations
+MARKERS = [_compile_markers(mask) for mask in range(1 << len(ANNOTATIONS))]
+
+
+def format_rich_text(rich_text):
+    """Convert Notion rich text to Markdown
+
+    Rich text is a list of [text] or [text, [format, ...]] segments. Markers
+    are applied in a fixed order (code innermost, link outermost), looked up
+    from a table compiled once per combination of annotations, and wrap the
+    text without its surrounding whitespace, which Markdown would not accept
+    inside them. Highlights and comments have no Markdown form and are dropped.
+
+    This differs from the renderer before RENDER_VERSION 2, which kept the
+    whitespace inside bold and link markers and nested them in the order the
+    formats were listed; the output now matches Notion's own export.
+
+    Args:
+        rich_text (list): Rich text segments
+
+    Returns:
+        str: Markdown text
+    """
+    if not rich_text or not isinstance(rich_text, list):
+        return ""
+    bits = ANNOTATION_BITS
+    text = ""
+    for part in rich_text:
+        if not isinstance(part, list):
+            continue
+        if len(part) == 1:
+            text += str(part[0])
+        elif len(part) == 2:
+            segment = str(part[0])
+            formats = part[1]
+            if not formats or not isinstance(formats, list):
+                text += segment
+                continue
+            mask = 0
+            link = None
+            for fmt in formats:
+                if fmt:
+                    bit = bits.get(fmt[0])
+                    if bit is None:
+                        if fmt[0] in MENTIONS:
+                            segment = _mention(segment, fmt)
+                    elif bit != LINK_BIT:
+                        mask |= bit
+                    elif len(fmt) > 1:
+                        mask |= bit
+                        link = fmt[1]
+            if mask:
+                core = segment.strip()
+                if core:
+                    opening, closing = MARKERS[mask]
+                    if link is not None:
+                        closing = f"{closing}{link})"
+                    if len(core) == len(segment):
+                        segment = opening + segment + closing
+                    else:
+                        start = segment.index(core)
+                        segment = segment[:start] + opening + core + closing + segment[start + len(core):]
+            text += segment
+    return text
+
+
+def plain_text(rich_text):
+    """Plain text of rich text, without annotations or mention values"""
+    if not isinstance(rich_text, list):
+        return ""
+    return "".join(str(part[0]) for part in rich_text if isinstance(part, list) and part)
+
+
+# Renderers look format_rich_text up as a global, so profiling can time it
+register_hot_path(sys.modules[__name__], 'format_rich_text', 'render.rich_text')
+
+
+# Block type -> handler(block, indent, debug) returning (Markdown lines, has content)
+BLOCK_RENDERERS = {}
+
+
+def register_renderer(*block_types):
+    """Register a Markdown handler for one or more block types
+
+    The handler is called as handler(block, indent, debug) and returns a tuple
+    (list of Markdown lines, whether the block has content). Blocks without
+    content are dropped with their children unless debugging. Registering a
+    type again replaces its handler; bump RENDER_VERSION when cached output
+    should be invalidated.
+
+    Args:
+        block_types (str): Block types handled
+
+    Returns:
+        callable: Decorator registering the handler
+    """
+    def decorator(handler):
+        for block_type in block_types:
+            BLOCK_RENDERERS[block_type] = handler
+        return handler
+    return decorator
+
+
+def render_block(block, indent="", debug=False):
+    """Render a single block, without its children, through the registry
+
+    Types without a handler are rendered as plain text when they have a title.
+
+    Returns:
+        tuple: (list of Markdown lines, whether the block has content)
+    """
+    return BLOCK_RENDERERS.get(block['type'], render_text)(block, indent, debug)
+
+
+@register_renderer(*TEXT_PREFIXES)
+def render_text(block, indent, debug):
+    """Title of a text block behind the Markdown prefix of its type"""
+    properties = block['properties']
+    if not properties or 'title' not in properties:
+        return [], False
+    text = format_rich_text(properties['title'])
+    if not text.strip():
+        return [], False
+    block_type = block['type']
+    prefix = TEXT_PREFIXES.get(block_type, '')
+    if block_type == 'to_do' and properties.get('checked') == [['Yes']]:
+        prefix = '- [x] '
+    return [f"{indent}{prefix}{text}"], True
+
+
+@register_renderer('code')
+def render_code(block, indent, debug):
+    properties = block['properties']
+    text = format_rich_text(properties['title']) if properties and 'title' in properties else ""
+    if not text.strip():
+        return [], False
+    return [f"{indent}```\n{text}\n{indent}```"], True
+
+
+@register_renderer('divider')
+def render_divider(block, indent, debug):
+    return [f"{indent}---"], True
+
+
+@register_renderer('table')
+def render_table(block, indent, debug):
+    """A table only lists its row ids in debug mode; its rows render themselves"""
+    if not block['content']:
+        return [], False
+    md = []
+    if debug:
+        md.append(f"{indent}\nTable:")
+        md.extend(f"{indent}- {row_id}" for row_id in block['content'])
+    return md, True
+
+
+@register_renderer('table_row')
+def render_table_row(block, indent, debug):
+    properties = block['properties']
+    if not properties or not isinstance(properties, dict):
+        return [], False
+    cells = [text for text in map(format_rich_text, properties.values()) if text]
+    if not cells:
+        return [], False
+    return [f"{indent}| " + " | ".join(cells) + " |"], True
+
+
+@register_renderer('image')
+def render_image(block, indent, debug):
+    properties = block['properties']
+    if not properties or 'source' not in properties:
+        return render_text(block, indent, debug)
+    source = properties['source'][0][0]
+    title = format_rich_text(properties.get('caption')) or properties.get('title', [['image']])[0][0]
+    return [f"{indent}![{title}]({source})"], True
+
+
+@register_renderer('bookmark')
+def render_bookmark(block, indent, debug):
+    properties = block['properties'] or {}
+    link = format_rich_text(properties.get('link'))
+    if not link:
+        return [], False
+    title = format_rich_text(properties.get('title')) or link
+    return [f"{indent}[{title}]({link})"], True
+
+
+@register_renderer('equation')
+def render_equation(block, indent, debug):
+    text = "".join(str(part[0]) for part in (block['properties'] or {}).get('title', []) if part)
+    if not text.strip():
+        return [], False
+    return [f"{indent}$$", f"{indent}{text}", f"{indent}$$"], True
+
+
+@register_renderer('column_list', 'column')
+def render_column(block, indent, debug):
+    """Columns have no Markdown form; their children are rendered in order"""
+    return [], bool(block['content'])
+
+
+def render_thread(thread, indent=""):
+    """Comment thread of a discussion as a blockquote
+
+    Args:
+        thread (dict): Discussion from NotionPageReader.get_page_comments
+        indent (str): Indentation of the quote, that of the block's children
+
+    Returns:
+        list: Markdown lines, one per comment after the thread header
+    """
+    header = "💬"
+    context = format_rich_text(thread.get('context'))
+    if context.strip():
+        header += f" “{context.strip()}”"
+    if thread.get('resolved'):
+        header += " (resolved)"
+    md = [f"{indent}> {header}"]
+    for comment in thread['comments']:
+        line = f"**{comment['author'] or comment['author_id'] or 'Unknown'}**"
+        if comment['created_time']:
+            line += f" ({comment['created_time']:%Y-%m-%d %H:%M})"
+        line += f": {format_rich_text(comment['text'])}"
+        if comment['reactions']:
+            line += "  " + " ".join(f"{icon} {count}" for icon, count in comment['reactions'])
+        md.append(f"{indent}> " + line.replace("\n", f"\n{indent}> "))
+    return md
+
+
+def render_metadata(block):
+    """Debug metadata lines of a block"""
+    md = [
+        "\n=== Metadata ===",
+        f"Type: {block['type']}",
+        f"ID: {block['id']}",
+        f"Created: {block['created_time']}",
+        f"Last Edited: {block['last_edited_time']}",
+        f"Creator: {block['created_by_name']}",
+        f"Parent ID: {block['parent_id']}",
+        f"Alive: {block['alive']}",
+    ]
+    if block['properties']:
+        md.append("Properties:")
+        md.append(json.dumps(block['properties'], ensure_ascii=False, indent=2))
+    if block['content']:
+        md.append("Content:")
+        md.append(json.dumps(block['content'], ensure_ascii=False, indent=2))
+    return md
@@ -1,155 +1,429 @@
 import sqlite3
-from datetime import datetime
 import json
+import hashlib
 import os
+import sys
 import argparse
+from datetime import datetime
+
+from notion_block import Block
+from notion_connection import shared_connection
+from notion_markdown import RENDER_VERSION, render_block, render_metadata, render_thread
+from notion_profile import PROFILER, add_profile_arguments, register_hot_path
+from notion_render_cache import RenderCache
+
+# Block types that own the blocks beneath them
+PAGE_TYPES = ('page', 'collection_view_page')
+
+
+def owning_pages(conn, block_ids, known=None):
+    """Resolve the owning page of each block by walking up its ancestors
+
+    Each level of ancestors is fetched in one batched query.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the Notion database
+        block_ids (list): Block IDs to resolve
+        known (dict): (parent_id, parent_table, type) of blocks seen so far,
+            extended in place so it can be reused across calls
+
+    Returns:
+        dict: Block ID -> owning page ID or None
+    """
+    if known is None:
+        known = {}
+    pending = [block_id for block_id in block_ids if block_id not in known]
+    while pending:
+        for i in range(0, len(pending), 500):
+            chunk = pending[i:i + 500]
+            rows = conn.execute(f"""
+                SELECT id, parent_id, parent_table, type
+                FROM block
+                WHERE id IN ({', '.join('?' * len(chunk))})
+            """, chunk).fetchall()
+            for block_id, parent_id, parent_table, block_type in rows:
+                known[block_id] = (parent_id, parent_table, block_type)
+        next_pending = set()
+        for block_id in pending:
+            info = known.setdefault(block_id, None)
+            if info and info[2] not in PAGE_TYPES and info[1] == 'block' and info[0] not in known:
+                next_pending.add(info[0])
+        pending = list(next_pending)
+
+    pages = {}
+    for block_id in block_ids:
+        current = block_id
+        seen = set()
+        page_id = None
+        while current is not None and current not in seen:
+            seen.add(current)
+            info = known.get(current)
+            if info is None:
+                break
+            if info[2] in PAGE_TYPES:
+                page_id = current
+                break
+            current = info[0] if info[1] == 'block' else None
+        pages[block_id] = page_id
+    return pages
+
+
+def _rich_text(value):
+    """Decode a rich text column, None when it is empty or not JSON"""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return None
+
+
+def _count_blocks(span, blocks):
+    """Record the rows and deepest level of fetched blocks on a profiler span"""
+    if span:
+        span.count('rows', len(blocks))
+        span.maximum('max_depth', max((block['level'] for block in blocks), default=0))
+
 
 class NotionPageReader:
-    def _convert_to_markdown(self, block, blocks, debug=False, level=0):
-        """Convert Notion blocks to Markdown format
+    def _index_blocks(self, blocks):
+        """Build an id -> block index for a list of blocks
 
         Args:
-            block (dict): Notion block data
             blocks (list): List of all blocks
+
+        Returns:
+            dict: Mapping of block ID to block (first occurrence wins)
+        """
+        index = {}
+        for b in blocks:
+            index.setdefault(b['id'], b)
+        return index
+
+    def _child_blocks(self, block, index):
+        """Yield the child blocks of a block, in content order
+
+        Args:
+            block (dict): Notion block data
+            index (dict): Block index from _index_blocks
+
+        Yields:
+            dict: Child block data
+        """
+        if block['content'] and block['type'] != 'page':
+            for child_id in block['content']:
+                child_block = index.get(child_id)
+                if child_block:
+                    yield child_block
+
+    def _format_block(self, block, debug=False, level=0):
+        """Format a single Notion block, without its children
+
+        Args:
+            block (dict): Notion block data
             debug (bool): Enable debug mode
             level (int): Current block level (starts from 0)
 
         Returns:
-            str: Markdown formatted text
+            tuple: (list of Markdown lines, whether the block has content)
         """
-        block_type = block['type']
-        md = []
-        has_content = False
-
-        # Add indentation
-        indent = "  " * level
-
-        def parse_rich_text(rich_text):
-            if not rich_text or not isinstance(rich_text, list):
-                return ""
-            text = ""
-            for part in rich_text:
-                if isinstance(part, list):
-                    if len(part) == 1:
-                        text += str(part[0])
-                    elif len(part) == 2:
-                        format_text = str(part[0])
-                        formats = part[1]
-                        if isinstance(formats, list):
-                            for fmt in formats:
-                                if fmt == ['b']:
-                                    format_text = f"**{format_text}**"
-                                elif fmt[0] == 'a':
-                                    format_text = f"[{format_text}]({fmt[1]})"
-                        text += format_text
-            return text
-
-        # Convert based on block type
-        if block['properties'] and 'title' in block['properties']:
-            text = parse_rich_text(block['properties']['title'])
-            if text.strip():
-                if block_type in ['heading1', 'header']:
-                    md.append(f"{indent}# {text}")
-                elif block_type in ['heading2', 'sub_header']:
-                    md.append(f"{indent}## {text}")
-                elif block_type in ['heading3', 'sub_sub_header']:
-                    md.append(f"{indent}### {text}")
-                elif block_type == 'bulleted_list_item':
-                    md.append(f"{indent}- {text}")
-                elif block_type == 'numbered_list_item':
-                    md.append(f"{indent}1. {text}")
-                elif block_type == 'to_do':
-                    md.append(f"{indent}- [ ] {text}")
-                elif block_type == 'toggle':
-                    md.append(f"{indent}> {text}")
-                elif block_type == 'quote':
-                    md.append(f"{indent}> {text}")
-                elif block_type == 'callout':
-                    md.append(f"{indent}💡 {text}")
-                elif block_type == 'code':
-                    md.append(f"{indent}```\n{text}\n{indent}```")
-                else:  # paragraph or other text types
-                    md.append(f"{indent}{text}")
-                has_content = True
-
-        elif block_type == 'divider':
-            md.append(f"{indent}---")
-            has_content = True
-            
-        elif block_type == 'table':
-            if block['content']:
-                if debug:
-                    md.append(f"{indent}\nTable:")
-                    for row_id in block['content']:
-                        md.append(f"{indent}- {row_id}")
-                has_content = True
-                    
-        elif block_type == 'table_row':
-            if block['properties']:
-                cells = []
-                for key, value in block['properties'].items():
-                    cell_text = parse_rich_text(value)
-                    if cell_text:
-                        cells.append(cell_text)
-                if cells:
-                    md.append(f"{indent}| " + " | ".join(cells) + " |")
-                    has_content = True
-
-        elif block_type == 'image' and block['properties'] and 'source' in block['properties']:
-            source = block['properties']['source'][0][0]
-            title = block['properties'].get('title', [['image']])[0][0]
-            md.append(f"{indent}![{title}]({source})")
-            has_content = True
+        md, has_content = render_block(block, "  " * level, debug)
 
         # Add metadata in debug mode
         if debug:
-            md.append("\n=== Metadata ===")
-            md.append(f"Type: {block_type}")
-            md.append(f"ID: {block['id']}")
-            md.append(f"Created: {block['created_time']}")
-            md.append(f"Last Edited: {block['last_edited_time']}")
-            md.append(f"Creator: {block['created_by_name']}")
-            md.append(f"Parent ID: {block['parent_id']}")
-            md.append(f"Alive: {block['alive']}")
-            if block['properties']:
-                md.append("Properties:")
-                md.append(json.dumps(block['properties'], ensure_ascii=False, indent=2))
-            if block['content']:
-                md.append("Content:")
-                md.append(json.dumps(block['content'], ensure_ascii=False, indent=2))
-
-        # Process child blocks if not page type
-        if block['content'] and block_type != 'page':
-            for child_id in block['content']:
-                child_block = next((b for b in blocks if b['id'] == child_id), None)
-                if child_block:
-                    child_md = self._convert_to_markdown(child_block, blocks, debug, level + 1)
-                    if child_md:
-                        md.append(child_md)
+            md = md + render_metadata(block)
+
+        return md, has_content
+
+    def _format_block_cached(self, block, debug=False, level=0):
+        """_format_block through the render cache, keyed on (id, version, level, debug)
+
+        Returns:
+            tuple: (list of Markdown lines, whether the block has content)
+        """
+        if self.cache is None or block.get('version') is None:
+            return self._format_block(block, debug, level)
+
+        key = f"b{RENDER_VERSION}:{block['id']}:{block['version']}:{level}:{int(debug)}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached[0]), cached[1]
+        md, has_content = self._format_block(block, debug, level)
+        self.cache.put(key, [list(md), has_content])
+        return md, has_content
+
+    def _subtree_keys(self, block, index, debug=False, level=0, threads=None):
+        """Compute a cache key for every subtree below a block
+
+        A subtree key hashes the block's id, version, level and the keys of its
+        children, so it changes whenever any descendant changes version.
+        Subtrees holding a comment thread get no key: threads have no version.
+
+        Returns:
+            dict: (block ID, level) -> subtree key, or None
+        """
+        keys = {}
+        path = {block['id']}
+        stack = [(block['id'], block['version'], level, self._child_blocks(block, index), [])]
+        while stack:
+            block_id, version, block_level, children, child_keys = stack[-1]
+            for child_block in children:
+                child_id = child_block['id']
+                if child_id in path:
+                    continue
+                path.add(child_id)
+                stack.append((child_id, child_block['version'], block_level + 1,
+                              self._child_blocks(child_block, index), []))
+                break
+            else:
+                stack.pop()
+                path.discard(block_id)
+                if threads and (threads.get(block_id) or None in child_keys):
+                    digest = None
+                else:
+                    digest = hashlib.blake2b(
+                        repr((RENDER_VERSION, block_id, version, block_level, debug, child_keys)).encode(),
+                        digest_size=16,
+                    ).hexdigest()
+                keys[(block_id, block_level)] = digest
+                if stack:
+                    stack[-1][4].append(digest)
+        return keys
+
+    def _cached_child_lines(self, block, index, debug=False, level=0, threads=None):
+        """Render the descendants of a block, reusing cached subtrees
+
+        Subtrees whose key is cached are copied as-is; only blocks on the path
+        to a changed descendant are formatted again. Subtrees holding a comment
+        thread are always walked, with the threads beneath their blocks.
+
+        Returns:
+            list: Markdown lines
+        """
+        keys = self._subtree_keys(block, index, debug, level, threads)
+        lines = []
+        path = {block['id']}
+        stack = [(block['id'], level, self._child_blocks(block, index), lines, None)]
+        while stack:
+            block_id, block_level, children, acc, key = stack[-1]
+            for child_block in children:
+                if child_block['id'] in path:
+                    continue
+                child_key = keys[(child_block['id'], block_level + 1)]
+                if child_key is not None:
+                    child_key = "s:" + child_key
+                    cached = self.cache.get(child_key)
+                    if cached is not None:
+                        acc.extend(cached)
+                        continue
+                md, has_content = self._format_block_cached(child_block, debug, block_level + 1)
+                # Blocks without content are dropped with their children unless debugging
+                if not (debug or has_content):
+                    if child_key is not None:
+                        self.cache.put(child_key, [])
+                    continue
+                if child_key is None:
+                    md = md + list(self._thread_lines(threads, child_block['id'], block_level + 1))
+                path.add(child_block['id'])
+                stack.append((child_block['id'], block_level + 1, self._child_blocks(child_block, index), md, child_key))
+                break
+            else:
+                stack.pop()
+                path.discard(block_id)
+                if key is not None:
+                    self.cache.put(key, acc)
+                if stack:
+                    stack[-1][3].extend(acc)
+        return lines
+
+    def _iter_child_lines(self, block, index, debug=False, level=0, threads=None):
+        """Walk the descendants of a block and yield their Markdown lines
+
+        The tree is walked depth-first with an explicit stack, so nesting depth
+        is not limited by the recursion limit. A block that appears again among
+        its own descendants is skipped.
+
+        Args:
+            block (dict): Notion block data
+            index (dict): Block index from _index_blocks
+            debug (bool): Enable debug mode
+            level (int): Level of the parent block (starts from 0)
+            threads (dict): Comment threads from get_page_comments, rendered
+                beneath their blocks; subtrees holding one are not cached
+
+        Yields:
+            str: Markdown lines
+        """
+        if self.cache is not None and block.get('version') is not None:
+            yield from self._cached_child_lines(block, index, debug, level, threads)
+            return
+
+        path = {block['id']}
+        stack = [(block['id'], level, self._child_blocks(block, index))]
+        while stack:
+            block_id, block_level, children = stack[-1]
+            for child_block in children:
+                if child_block['id'] in path:
+                    continue
+                md, has_content = self._format_block_cached(child_block, debug, block_level + 1)
+                # Blocks without content are dropped with their children unless debugging
+                if not (debug or has_content):
+                    continue
+                yield from md
+                if threads:
+                    yield from self._thread_lines(threads, child_block['id'], block_level + 1)
+                path.add(child_block['id'])
+                stack.append((child_block['id'], block_level + 1, self._child_blocks(child_block, index)))
+                break
+            else:
+                stack.pop()
+                path.discard(block_id)
+
+    def _iter_markdown_lines(self, block, index, debug=False, level=0, threads=None):
+        """Yield the Markdown lines of a block and its children as they are rendered
+
+        Args:
+            block (dict): Notion block data
+            index (dict): Block index from _index_blocks
+            debug (bool): Enable debug mode
+            level (int): Current block level (starts from 0)
+            threads (dict): Comment threads from get_page_comments
+
+        Yields:
+            str: Markdown lines
+        """
+        md, has_content = self._format_block_cached(block, debug, level)
+        if not (debug or has_content):
+            return
+        yield from md
+        if threads:
+            yield from self._thread_lines(threads, block['id'], level)
+        yield from self._iter_child_lines(block, index, debug, level, threads)
+
+    @staticmethod
+    def _thread_lines(threads, block_id, level):
+        """Markdown lines of a block's comment threads, indented like its children"""
+        for thread in threads.get(block_id, ()):
+            yield from render_thread(thread, "  " * (level + 1))
+
+    def iter_page_markdown(self, blocks, debug=False):
+        """Yield the Markdown lines of a page as they are rendered
+
+        In non-debug mode only alive level-1 blocks are rendered, their children
+        are reached through the block tree. With comments enabled the threads
+        of the page itself come first and those of each block follow it, all
+        fetched up front by get_page_comments.
+
+        Args:
+            blocks (list): Blocks returned by get_page_blocks
+            debug (bool): Enable debug mode
+
+        Yields:
+            str: Markdown lines
+        """
+        index = self._index_blocks(blocks)
+        threads = None
+        if self.comments:
+            page_ids = list(dict.fromkeys(block['parent_id'] for block in blocks if block['level'] == 1))
+            threads = self.get_page_comments(page_ids + list(index))
+            for page_id in page_ids:
+                for thread in threads.get(page_id, ()):
+                    yield from render_thread(thread)
+        for block in blocks:
+            if not debug:
+                if block['level'] > 1 or block['alive'] != 1:
+                    continue
+            yield from self._iter_markdown_lines(block, index, debug, threads=threads)
+
+    def write_markdown(self, blocks, out, debug=False):
+        """Stream the Markdown of a page to a file handle, line by line
+
+        Args:
+            blocks (list): Blocks returned by get_page_blocks
+            out (file): Writable text file handle, e.g. sys.stdout
+            debug (bool): Enable debug mode
+        """
+        for line in self.iter_page_markdown(blocks, debug):
+            out.write(line)
+            out.write("\n")
+
+    def _convert_to_markdown(self, block, blocks, debug=False, level=0, index=None):
+        """Convert Notion blocks to Markdown format
+
+        Args:
+            block (dict): Notion block data
+            blocks (list): List of all blocks
+            debug (bool): Enable debug mode
+            level (int): Current block level (starts from 0)
+            index (dict): Prebuilt block index, built from blocks if omitted
+
+        Returns:
+            str: Markdown formatted text
+        """
+        md, has_content = self._format_block_cached(block, debug, level)
 
         # Always return content in debug mode, otherwise only if has_content
-        return "\n".join(md) if (debug or has_content) else None
-    
-    def __init__(self, db_path):
+        if not (debug or has_content):
+            return None
+
+        if index is None:
+            index = self._index_blocks(blocks)
+        md.extend(self._iter_child_lines(block, index, debug, level))
+        return "\n".join(md)
+
+    def __init__(self, db_path, immutable=False, snapshot=False, cache=None, hierarchy=None, comments=False):
+        """Initialise NotionPageReader
+
+        Args:
+            db_path (str): Path to the Notion database file
+            immutable (bool): Open the database with immutable=1
+            snapshot (bool): Read from a private copy of the database
+            cache (RenderCache): Optional cache of rendered blocks and subtrees
+            hierarchy (NotionHierarchyIndex): Optional hierarchy index answering
+                subtree fetches with a range scan; the caller keeps it updated
+            comments (bool): Render comment threads beneath their blocks
+        """
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"Database file not found: {db_path}")
         self.db_path = db_path
+        self.cache = cache
+        self.hierarchy = hierarchy
+        self.comments = comments
+        self._comment_tables = None
+        # User ID -> name, shared by every page rendered with comments
+        self._user_names = {}
+        self.connection = shared_connection(db_path, immutable=immutable, snapshot=snapshot)
 
     def connect(self):
+        """Return this thread's shared read-only connection"""
         try:
-            return sqlite3.connect(self.db_path)
+            return self.connection.connection()
         except sqlite3.Error as e:
             raise Exception(f"Error connecting to Notion database: {e}")
             
-    def get_page_blocks(self, page_id):
+    def get_page_blocks(self, page_id, alive_only=False, max_depth=None):
         """Get all blocks for the specified page ID. If page type, only return direct children.
 
+        With alive_only or max_depth the filters are applied in SQL, the
+        recursion skips blocks already on the current path, and user names are
+        joined once on the final rows instead of at every recursion step.
+        With a hierarchy index and without alive_only, the blocks come from
+        one range scan of the index instead.
+
         Args:
             page_id (str): The page ID to get blocks for.
+            alive_only (bool): Leave out dead blocks and everything beneath them.
+            max_depth (int): Deepest level to return, level 1 being the direct children.
 
         Returns:
             list: List containing all page blocks.
         """
+        if self.hierarchy is not None and not alive_only:
+            with PROFILER.span('page.query') as span:
+                blocks = self.hierarchy.get_page_blocks(page_id, max_depth=max_depth)
+                _count_blocks(span, blocks)
+            return blocks
+
         try:
             conn = self.connect()
             cursor = conn.cursor()
@@ -160,6 +434,13 @@ class NotionPageReader:
             
             if not page_type:
                 return []
+
+            if alive_only or max_depth is not None:
+                with PROFILER.span('page.query') as span:
+                    cursor.execute(*self._filtered_query(page_id, page_type[0], alive_only, max_depth))
+                    blocks = Block.from_cursor(cursor)
+                    _count_blocks(span, blocks)
+                return blocks
                 
             if page_type[0] == 'page':
                 # For page type, only get direct children
@@ -170,6 +451,7 @@ class NotionPageReader:
                     block.type,
                     block.properties,
                     block.content,
+                    block.version,
                     created_time,
                     created_by_id,
                     name AS created_by_name,
@@ -192,6 +474,7 @@ class NotionPageReader:
                         block.type,
                         block.properties,
                         block.content,
+                        block.version,
                         created_time,
                         created_by_id,
                         name AS created_by_name,
@@ -212,6 +495,7 @@ class NotionPageReader:
                         b.type,
                         b.properties,
                         b.content,
+                        b.version,
                         b.created_time,
                         b.created_by_id,
                         u.name,
@@ -227,64 +511,461 @@ class NotionPageReader:
                 FROM block_hierarchy
                 """
 
-            cursor.execute(query, (page_id,))
-            columns = [description[0] for description in cursor.description]
-            blocks = []
-
-            for row in cursor.fetchall():
-                block = dict(zip(columns, row))
-
-                # Convert timestamps if they exist
-                if block['created_time']:
-                    block['created_time'] = datetime.fromtimestamp(block['created_time'] / 1000)
-                if block['last_edited_time']:
-                    block['last_edited_time'] = datetime.fromtimestamp(block['last_edited_time'] / 1000)
-
-                # Parse properties if they exist
-                if block['properties']:
-                    try:
-                        block['properties'] = json.loads(block['properties'])
-                    except json.JSONDecodeError:
-                        block['properties'] = None
-
-                # Parse content if it exists
-                if block['content']:
-                    try:
-                        block['content'] = json.loads(block['content'])
-                    except json.JSONDecodeError:
-                        block['content'] = None
-
-                blocks.append(block)
-            
+            with PROFILER.span('page.query') as span:
+                cursor.execute(query, (page_id,))
+                # Rows are wrapped as Block, which decodes JSON and timestamps on first access
+                blocks = Block.from_cursor(cursor)
+                _count_blocks(span, blocks)
+
             return blocks
 
         except sqlite3.Error as e:
             print(f"Database query error: {e}")
-        finally:
-            if conn:
-                conn.close()
+
+    def _filtered_query(self, page_id, page_type, alive_only, max_depth):
+        """Build the recursive fetch used by get_page_blocks when filters are given
+
+        The recursion only carries rowid, id, level and the path of ids from
+        the root, which guards against cycles. Block columns and the creator
+        name are read once per returned row.
+
+        Returns:
+            tuple: (query, parameters)
+        """
+        if page_type == 'page':
+            max_depth = 1
+        base_filter = "AND alive = 1" if alive_only else ""
+        step_filters = ["instr(h.path, '/' || b.id || '/') = 0"]
+        params = [page_id]
+        if alive_only:
+            step_filters.append("b.alive = 1")
+        if max_depth is not None:
+            step_filters.append("h.level < ?")
+            params.append(max_depth)
+
+        query = f"""
+        WITH RECURSIVE block_hierarchy(rid, id, level, path) AS (
+            -- Base query: get direct children
+            SELECT rowid, id, 1, '/' || id || '/'
+            FROM block
+            WHERE parent_id = ? {base_filter}
+
+            UNION ALL
+
+            -- Recursive part: children of children not already on the path
+            SELECT b.rowid, b.id, h.level + 1, h.path || b.id || '/'
+            FROM block_hierarchy h
+            INNER JOIN block b ON b.parent_id = h.id
+            WHERE {' AND '.join(step_filters)}
+        )
+        SELECT
+            block.id,
+            block.parent_id,
+            block.type,
+            block.properties,
+            block.content,
+            block.version,
+            created_time,
+            created_by_id,
+            name AS created_by_name,
+            last_edited_time,
+            last_edited_by_id,
+            h.level,
+            block.alive
+        FROM block_hierarchy h
+        INNER JOIN block ON block.rowid = h.rid
+        INNER JOIN notion_user ON notion_user.id = block.created_by_id
+        """
+        return query, params
+
+    def iter_page_blocks(self, page_id, chunk_size=1000, alive_only=False, max_depth=None):
+        """Stream the blocks of a page in chunks of at most chunk_size blocks
+
+        Blocks are fetched level by level with keyset pagination on
+        (position of the parent in the level above, rowid), so memory holds one
+        chunk plus the ids of the blocks seen so far. The parents of a level
+        are bound a window of chunk_size ids at a time, so each id is sent a
+        bounded number of times however many parents a level has. Blocks come
+        in the same order as get_page_blocks returns them; a chunk never spans
+        two levels.
+
+        Args:
+            page_id (str): The page ID to get blocks for
+            chunk_size (int): Maximum blocks per chunk
+            alive_only (bool): Leave out dead blocks and everything beneath them
+            max_depth (int): Deepest level to return, level 1 being the direct children
+
+        Yields:
+            list: Chunks of blocks
+        """
+        cursor = self.connect().cursor()
+        cursor.execute("SELECT type FROM block WHERE id = ?", (page_id,))
+        page_type = cursor.fetchone()
+        if not page_type:
+            return
+        if page_type[0] == 'page':
+            max_depth = 1
+
+        query = f"""
+            SELECT
+                block.id,
+                block.parent_id,
+                block.type,
+                block.properties,
+                block.content,
+                block.version,
+                created_time,
+                created_by_id,
+                name AS created_by_name,
+                last_edited_time,
+                last_edited_by_id,
+                ? AS level,
+                block.alive,
+                parents.key,
+                block.rowid
+            FROM json_each(?) parents
+            INNER JOIN block ON block.rowid IN (
+                SELECT rowid FROM block
+                WHERE parent_id = parents.value AND (parents.key > 0 OR rowid > ?)
+                    {"AND alive = 1" if alive_only else ""}
+                ORDER BY rowid
+                LIMIT ?
+            )
+            INNER JOIN notion_user ON notion_user.id = block.created_by_id
+            ORDER BY parents.key, block.rowid
+            LIMIT ?
+        """
+        # json_each is not known to be in key order, so the ORDER BY sorts; taking
+        # at most LIMIT children per parent, in block_parent_id index order, bounds
+        # that sort however many children a parent has
+        seen = {page_id}
+        parents = [page_id]
+        level = 1
+        while parents and (max_depth is None or level <= max_depth):
+            children = []
+            chunk = []
+            # Keyset: the window starts at the parent of the last row, after its rowid
+            position = 0
+            after_rowid = -1
+            while position < len(parents):
+                limit = chunk_size - len(chunk)
+                cursor.execute(query, (level, json.dumps(parents[position:position + chunk_size]), after_rowid,
+                                       limit, limit))
+                columns = Block.columns(cursor.description[:-2])
+                rows = cursor.fetchall()
+                for row in rows:
+                    # A block reached again through a cycle is skipped with its subtree
+                    if row[0] in seen:
+                        continue
+                    seen.add(row[0])
+                    children.append(row[0])
+                    chunk.append(Block(columns, row))
+                if len(rows) < limit:
+                    # Every child of the window was read
+                    position += chunk_size
+                    after_rowid = -1
+                else:
+                    position += rows[-1][-2]
+                    after_rowid = rows[-1][-1]
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+            parents = children
+            level += 1
+
+    def get_pages_blocks(self, page_ids, subtrees=False):
+        """Get the blocks of many pages with a constant number of queries.
+
+        Each root is handled like get_page_blocks: page types return only their
+        direct children, other types their whole subtree. The ids are passed as
+        one JSON array, so one query looks up every root type, one fetches the
+        children of all page roots and one the subtrees of all other roots.
+
+        With subtrees, every root returns its whole subtree, stopping at child
+        pages: those are included but not what lies beneath them, which is the
+        content of each page on its own.
+
+        Args:
+            page_ids (list): The page IDs to get blocks for.
+            subtrees (bool): Return the full content of page roots too.
+
+        Returns:
+            dict: Page ID -> list of its blocks, as get_page_blocks returns them.
+                  Unknown page IDs map to an empty list.
+        """
+        pages = {page_id: [] for page_id in page_ids}
+        try:
+            cursor = self.connect().cursor()
+
+            # Check page types
+            cursor.execute("""
+                SELECT value, (SELECT type FROM block WHERE id = value LIMIT 1)
+                FROM json_each(?)
+            """, (json.dumps(list(pages)),))
+            roots = cursor.fetchall()
+            if subtrees:
+                page_roots = []
+                tree_roots = [root_id for root_id, root_type in roots if root_type is not None]
+            else:
+                page_roots = [root_id for root_id, root_type in roots if root_type == 'page']
+                tree_roots = [root_id for root_id, root_type in roots if root_type not in (None, 'page')]
+
+            if page_roots:
+                # For page type, only get direct children
+                cursor.execute("""
+                SELECT
+                    block.id,
+                    block.parent_id,
+                    block.type,
+                    block.properties,
+                    block.content,
+                    block.version,
+                    created_time,
+                    created_by_id,
+                    name AS created_by_name,
+                    last_edited_time,
+                    last_edited_by_id,
+                    1 as level,
+                    block.alive,
+                    roots.value AS root_id
+                FROM json_each(?) roots
+                INNER JOIN block ON block.parent_id = roots.value
+                INNER JOIN notion_user ON notion_user.id = block.created_by_id
+                """, (json.dumps(page_roots),))
+                self._group_by_root(cursor, pages)
+
+            if tree_roots:
+                # For other types, one recursive query tagged with each row's root
+                stop = f"WHERE h.type NOT IN ({', '.join('?' * len(PAGE_TYPES))})" if subtrees else ""
+                cursor.execute(f"""
+                WITH RECURSIVE block_hierarchy AS (
+                    -- Base query: get direct children
+                    SELECT
+                        block.id,
+                        block.parent_id,
+                        block.type,
+                        block.properties,
+                        block.content,
+                        block.version,
+                        created_time,
+                        created_by_id,
+                        name AS created_by_name,
+                        last_edited_time,
+                        last_edited_by_id,
+                        1 as level,
+                        block.alive,
+                        roots.value AS root_id
+                    FROM json_each(?) roots
+                    INNER JOIN block ON block.parent_id = roots.value
+                    INNER JOIN notion_user ON notion_user.id = block.created_by_id
+
+                    UNION ALL
+
+                    -- Recursive part: get children of children
+                    SELECT
+                        b.id,
+                        b.parent_id,
+                        b.type,
+                        b.properties,
+                        b.content,
+                        b.version,
+                        b.created_time,
+                        b.created_by_id,
+                        u.name,
+                        b.last_edited_time,
+                        b.last_edited_by_id,
+                        h.level + 1,
+                        b.alive,
+                        h.root_id
+                    FROM block b
+                    INNER JOIN block_hierarchy h ON h.id = b.parent_id
+                    INNER JOIN notion_user u ON u.id = b.created_by_id
+                    {stop}
+                )
+                SELECT *
+                FROM block_hierarchy
+                """, (json.dumps(tree_roots), *(PAGE_TYPES if subtrees else ())))
+                self._group_by_root(cursor, pages)
+
+            return pages
+
+        except sqlite3.Error as e:
+            print(f"Database query error: {e}")
+
+    @staticmethod
+    def _group_by_root(cursor, pages):
+        """Append the rows of an executed cursor to the list of their root
+
+        root_id is the last column and is left out of the blocks.
+        """
+        columns = Block.columns(cursor.description[:-1])
+        root_index = len(cursor.description) - 1
+        for row in cursor:
+            pages[row[root_index]].append(Block(columns, row))
+
+    def get_page_comments(self, block_ids):
+        """Fetch the comment threads of many blocks in a constant number of queries
+
+        One query walks block.discussions and discussion.comments for every
+        block at once, following the ID lists by primary key so threads and
+        comments keep their order; one more query reads the reactions listed
+        in comment.reactions the same way, and author names come from a
+        notion_user lookup cached on the reader, so only users not seen
+        before are queried. No table is scanned, whatever its size.
+
+        Args:
+            block_ids (list): Block IDs, e.g. a page and its blocks
+
+        Returns:
+            dict: Block ID -> list of threads, each a dict with id, resolved,
+                  context and comments; a comment has id, author_id, author,
+                  created_time, text (rich text) and reactions as
+                  [(icon, count)]
+        """
+        try:
+            conn = self.connect()
+            if self._comment_tables is None:
+                self._comment_tables = {row[0] for row in conn.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type = 'table' AND name IN ('discussion', 'comment', 'reaction')
+                """)}
+            if not {'discussion', 'comment'} <= self._comment_tables:
+                return {}
+
+            with PROFILER.span('page.comments') as span:
+                rows = conn.execute("""
+                    SELECT ids.value, d.id, d.resolved, d.context,
+                           c.id, c.created_by_id, c.created_time, c.text, c.reactions
+                    FROM json_each(?) ids
+                    INNER JOIN block b ON b.id = ids.value
+                    INNER JOIN json_each(CASE WHEN json_valid(b.discussions) THEN b.discussions END) bd
+                    INNER JOIN discussion d ON d.id = bd.value
+                    INNER JOIN json_each(CASE WHEN json_valid(d.comments) THEN d.comments END) dc
+                    INNER JOIN comment c ON c.id = dc.value AND c.alive = 1
+                    ORDER BY ids.key, bd.key, dc.key
+                """, (json.dumps(list(block_ids)),)).fetchall()
+
+                threads = {}
+                comments = {}
+                reactions = {}
+                seen = set()
+                # The same records may be cached once per meta_user_id
+                for (block_id, discussion_id, resolved, context, comment_id, author_id, created, text,
+                     reaction_ids) in rows:
+                    if (block_id, discussion_id, comment_id) in seen:
+                        continue
+                    seen.add((block_id, discussion_id, comment_id))
+                    block_threads = threads.setdefault(block_id, [])
+                    if not block_threads or block_threads[-1]['id'] != discussion_id:
+                        block_threads.append({'id': discussion_id, 'resolved': bool(resolved),
+                                              'context': _rich_text(context), 'comments': []})
+                    comment = {
+                        'id': comment_id,
+                        'author_id': author_id,
+                        'author': None,
+                        'created_time': datetime.fromtimestamp(created / 1000) if created else None,
+                        'text': _rich_text(text),
+                        'reactions': [],
+                    }
+                    block_threads[-1]['comments'].append(comment)
+                    comments.setdefault(comment_id, []).append(comment)
+                    reaction_ids = _rich_text(reaction_ids)
+                    if isinstance(reaction_ids, list):
+                        for reaction_id in reaction_ids:
+                            reactions.setdefault(reaction_id, set()).add(comment_id)
+
+                if reactions and 'reaction' in self._comment_tables:
+                    # Icon -> actor count per comment, icons in the order they were first used
+                    counts = {}
+                    for reaction_id, icon, actors in conn.execute("""
+                        SELECT r.id, r.icon, coalesce(json_array_length(
+                            CASE WHEN json_valid(r.actors) THEN r.actors END), 1)
+                        FROM json_each(?) ids
+                        INNER JOIN reaction r ON r.id = ids.value
+                        GROUP BY r.id
+                        ORDER BY min(r.created_time), ids.key
+                    """, (json.dumps(list(reactions)),)):
+                        for comment_id in reactions[reaction_id]:
+                            icons = counts.setdefault(comment_id, {})
+                            icons[icon] = icons.get(icon, 0) + actors
+                    for comment_id, icons in counts.items():
+                        for comment in comments[comment_id]:
+                            comment['reactions'] = list(icons.items())
+
+                names = self._resolve_user_names(conn, {comment['author_id'] for same_id in comments.values()
+                                                        for comment in same_id})
+                for same_id in comments.values():
+                    for comment in same_id:
+                        comment['author'] = names.get(comment['author_id'])
+                if span:
+                    span.count('threads', sum(len(block_threads) for block_threads in threads.values()))
+                    span.count('comments', len(seen))
+            return threads
+
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading comments: {e}")
+
+    def _resolve_user_names(self, conn, user_ids):
+        """Names of users, querying notion_user only for IDs not cached yet"""
+        missing = [user_id for user_id in user_ids if user_id and user_id not in self._user_names]
+        if missing:
+            for user_id in missing:
+                self._user_names[user_id] = None
+            for user_id, name in conn.execute("""
+                SELECT id, name FROM notion_user
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(missing),)):
+                self._user_names[user_id] = name
+        return self._user_names
+
+# Per-block work, timed only while profiling
+register_hot_path(NotionPageReader, 'get_pages_blocks', 'pages.query', span=True)
+register_hot_path(NotionPageReader, 'iter_page_markdown', 'page.render', span=True)
+register_hot_path(NotionPageReader, '_index_blocks', 'render.index')
+register_hot_path(NotionPageReader, '_child_blocks', 'render.children')
+register_hot_path(NotionPageReader, '_format_block', 'render.format')
+
 
 def main():
     parser = argparse.ArgumentParser(description='Read all blocks from a Notion page')
     parser.add_argument('page_id', help='Notion page ID')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode to show detailed info')
+    parser.add_argument('-o', '--output', help='Write Markdown to this file instead of stdout')
+    parser.add_argument('--immutable', action='store_true', help='Open the database as immutable (Notion app must not be writing)')
+    parser.add_argument('--snapshot', action='store_true', help='Read from a private snapshot of the database')
+    parser.add_argument('--cache', help='Persist rendered blocks in this file and reuse unchanged ones')
+    parser.add_argument('--alive-only', action='store_true', help='Skip dead blocks and their children in the query')
+    parser.add_argument('--max-depth', type=int, help='Deepest block level to fetch')
+    parser.add_argument('--comments', action='store_true', help='Render comment threads beneath their blocks')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to read, e.g. a mirror synced by sqldb.py')
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
-    db_path = os.path.expanduser("~/Library/Application Support/Notion/notion.db")
-    reader = NotionPageReader(db_path)
-    blocks = reader.get_page_blocks(args.page_id)
-    
-    print(f"# Page Content - {args.page_id}\n")
-
-    for block in blocks:
-        # In non-debug mode, filter out blocks with level > 1 or alive != 1
-        if not args.debug:
-            if block['level'] > 1 or block['alive'] != 1:
-                continue
-        
-        markdown = reader._convert_to_markdown(block, blocks, debug=args.debug)
-        if markdown:
-            print(markdown)
+    if args.profile:
+        PROFILER.enable(cprofile=args.profile_cprofile, memory=args.profile_memory)
+    db_path = os.path.expanduser(args.db)
+    cache = RenderCache(path=args.cache, version=RENDER_VERSION) if args.cache else None
+    reader = NotionPageReader(db_path, immutable=args.immutable, snapshot=args.snapshot, cache=cache,
+                              comments=args.comments)
+    blocks = reader.get_page_blocks(args.page_id, alive_only=args.alive_only, max_depth=args.max_depth)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        out.write(f"# Page Content - {args.page_id}\n\n")
+        reader.write_markdown(blocks, out, debug=args.debug)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if cache is not None:
+            cache.close()
+            print(f"Render cache: {cache.stats()}", file=sys.stderr)
+        if args.profile:
+            PROFILER.disable()
+            PROFILER.dump(args.profile)
+            PROFILER.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,317 @@
+import json
+import inspect
+import sys
+import threading
+import time
+
+# (owner, attribute, phase, size, span) of every registered hot path
+HOT_PATHS = []
+
+
+class _NullSpan:
+    """Span handed out while profiling is disabled; every method is a no-op"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def count(self, name, value=1):
+        pass
+
+    def maximum(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Timer of one phase, with counters recorded under the phase name"""
+
+    __slots__ = ('profiler', 'name', 'start', 'counts', 'maxima')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.counts = {}
+        self.maxima = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.counts, self.maxima)
+        return False
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def maximum(self, name, value):
+        if value is not None and value > self.maxima.get(name, value - 1):
+            self.maxima[name] = value
+
+
+class Profiler:
+    """Per-phase timers and counters for the readers
+
+    Readers wrap their coarse phases (queries, renders) in profiler.span(),
+    which returns a shared no-op object while the profiler is disabled, so
+    the disabled cost is one attribute check per phase. Per-block hot paths
+    (JSON decoding, timestamp conversion, child lookups, formatting) are
+    registered with register_hot_path and only wrapped with timers while
+    the profiler is enabled; disabled, the original functions run untouched.
+
+    Phases nest: the time of page.render includes the formatting and the
+    lazy decoding done while rendering. Hooks receive every finished span
+    as hook(name, seconds, counts) and may forward them to a metrics system;
+    hot paths marked span=False are only aggregated.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._patched = []
+        self._cprofile = None
+        self._tracemalloc = False
+        self.reset()
+
+    def reset(self):
+        """Forget every recorded phase and counter"""
+        with self._lock:
+            self.phases = {}
+            self.counters = {}
+            self.maxima = {}
+
+    def span(self, name):
+        """Context manager timing one phase
+
+        Args:
+            name (str): Phase name, e.g. 'page.query'
+
+        Returns:
+            Span with count(name, value) and maximum(name, value), falsy and
+            inert while the profiler is disabled
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds, counts=None, maxima=None, hooks=True):
+        """Add one finished phase
+
+        Args:
+            name (str): Phase name
+            seconds (float): Duration
+            counts (dict): Counter increments, stored as <name>.<counter>
+            maxima (dict): Values kept as running maxima, as <name>.<counter>
+            hooks (bool): Pass the span on to the hooks
+        """
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = self.phases[name] = [0, 0.0]
+            phase[0] += 1
+            phase[1] += seconds
+            if counts:
+                for counter, value in counts.items():
+                    key = f"{name}.{counter}"
+                    self.counters[key] = self.counters.get(key, 0) + value
+            if maxima:
+                for counter, value in maxima.items():
+                    key = f"{name}.{counter}"
+                    if key not in self.maxima or value > self.maxima[key]:
+                        self.maxima[key] = value
+        if hooks:
+            for hook in self.hooks:
+                hook(name, seconds, counts or {})
+
+    def add_hook(self, hook):
+        """Forward finished spans to hook(name, seconds, counts)"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def enable(self, cprofile=False, memory=False):
+        """Start recording, wrapping the registered hot paths
+
+        Args:
+            cprofile (bool): Also run cProfile over the profiled code
+            memory (bool): Also trace allocations with tracemalloc
+        """
+        if self.enabled:
+            return
+        for owner, attribute, phase, size, span in HOT_PATHS:
+            original = owner[attribute] if isinstance(owner, dict) else getattr(owner, attribute)
+            self._patch(owner, attribute, self._timed(original, phase, size, span))
+            self._patched.append((owner, attribute, original))
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc = True
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording and restore the hot paths; recorded data is kept"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        while self._patched:
+            owner, attribute, original = self._patched.pop()
+            self._patch(owner, attribute, original)
+
+    @staticmethod
+    def _patch(owner, attribute, value):
+        if isinstance(owner, dict):
+            owner[attribute] = value
+        else:
+            setattr(owner, attribute, value)
+
+    def _timed(self, fn, phase, size, span):
+        """Wrap fn so each call adds to phase; generators are timed while running"""
+        record = self.record
+        clock = time.perf_counter
+
+        if inspect.isgeneratorfunction(fn):
+            def timed(*args, **kwargs):
+                elapsed = 0.0
+                items = 0
+                start = clock()
+                # False while suspended at the yield, so an early close adds nothing more
+                running = True
+                iterator = fn(*args, **kwargs)
+                try:
+                    while True:
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        elapsed += clock() - start
+                        running = False
+                        items += 1
+                        yield item
+                        start = clock()
+                        running = True
+                finally:
+                    if running:
+                        elapsed += clock() - start
+                    record(phase, elapsed, {'items': items}, hooks=span)
+        else:
+            def timed(*args, **kwargs):
+                start = clock()
+                result = fn(*args, **kwargs)
+                elapsed = clock() - start
+                counts = None
+                if size is not None:
+                    counts = {'bytes': size(*args, **kwargs)}
+                record(phase, elapsed, counts, hooks=span)
+                return result
+
+        timed.__name__ = getattr(fn, '__name__', phase)
+        timed.__doc__ = getattr(fn, '__doc__', None)
+        timed.__wrapped__ = fn
+        return timed
+
+    def report(self, top=20):
+        """Summarise what was recorded
+
+        Args:
+            top (int): Entries listed from cProfile and tracemalloc
+
+        Returns:
+            dict: phases (calls, seconds, mean_ms), counters, maxima and,
+                  when captured, cprofile and memory
+        """
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][1], reverse=True)
+            result = {
+                'phases': {
+                    name: {'calls': calls, 'seconds': round(seconds, 6),
+                           'mean_ms': round(seconds * 1000 / calls, 4) if calls else 0}
+                    for name, (calls, seconds) in phases
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'maxima': dict(sorted(self.maxima.items())),
+            }
+
+        if self._cprofile is not None:
+            import pstats
+            stats = pstats.Stats(self._cprofile).stats
+            functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            result['cprofile'] = [
+                {'function': f"{filename}:{line}({name})", 'calls': calls, 'tottime': round(tottime, 6),
+                 'cumtime': round(cumtime, 6)}
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in functions
+            ]
+
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:top]
+            result['memory'] = {
+                'current': current,
+                'peak': peak,
+                'top': [{'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                        for stat in statistics],
+            }
+        return result
+
+    def stop(self):
+        """Disable and stop tracemalloc if this profiler started it"""
+        self.disable()
+        if self._tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracemalloc = False
+
+    def dump(self, path=None, top=20):
+        """Write the report as JSON to a file, or to stderr when path is None or '-'"""
+        report = self.report(top)
+        if path in (None, '-'):
+            json.dump(report, sys.stderr, indent=2)
+            sys.stderr.write("\n")
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+
+# Process-wide profiler used by every reader
+PROFILER = Profiler()
+
+
+def register_hot_path(owner, attribute, phase, size=None, span=False):
+    """Mark a function to be timed while the profiler is enabled
+
+    Args:
+        owner: Class, module or dict holding the function
+        attribute (str): Attribute name or dict key of the function
+        phase (str): Phase the calls are recorded under
+        size (callable): Called with the call's arguments, returns the bytes
+            handled, counted as <phase>.bytes
+        span (bool): Pass each call on to the hooks as a span
+    """
+    HOT_PATHS.append((owner, attribute, phase, size, span))
+
+
+def add_profile_arguments(parser):
+    """Add --profile, --profile-cprofile and --profile-memory to a CLI parser"""
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help='Record per-phase timings and counters, written as JSON to FILE or stderr')
+    parser.add_argument('--profile-cprofile', action='store_true', help='Include cProfile hot spots in --profile')
+    parser.add_argument('--profile-memory', action='store_true', help='Include tracemalloc peaks in --profile')
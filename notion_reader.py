@@ -1,29 +1,51 @@
 import sqlite3
-from datetime import datetime
 import json
 import os
+import argparse
+
+from notion_block import Block
+from notion_connection import shared_connection
+from notion_profile import PROFILER, add_profile_arguments
 
 class NotionDatabaseReader:
-    def __init__(self, db_path):
+    def __init__(self, db_path, immutable=False, snapshot=False, hierarchy=None):
         """初始化NotionDatabaseReader
 
         Args:
             db_path (str): Notion數據庫文件的路徑
+            immutable (bool): 以 immutable 模式打開數據庫
+            snapshot (bool): 從數據庫的私有快照讀取
+            hierarchy (NotionHierarchyIndex): 可選的層級索引，root_page_id 與
+                level 改為點查詢；索引需由調用方保持更新
         """
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"找不到數據庫文件：{db_path}")
         
         self.db_path = db_path
+        self.hierarchy = hierarchy
+        self.connection = shared_connection(db_path, immutable=immutable, snapshot=snapshot)
         
     def connect(self):
-        """連接到Notion數據庫"""
+        """取得當前線程共用的唯讀連接"""
         try:
-            return sqlite3.connect(self.db_path)
+            return self.connection.connection()
         except sqlite3.Error as e:
             raise Exception(f"連接數據庫時發生錯誤：{str(e)}")
 
-    def get_entries(self):
-        """獲取Notion中的所有條目
+    def get_entries(self, limit=20, offset=0, after=None, types=None, space_id=None):
+        """獲取Notion中最近修改的條目
+
+        先按 last_edited_time 取出前 N 行（有索引時使用索引），再只為這 N 行
+        向上追溯祖先以得到 root_page_id 與 level，延遲只取決於 N，
+        而不是整個工作區的大小。
+
+        Args:
+            limit (int): 返回的條目數
+            offset (int): 跳過的條目數
+            after (Block|tuple): 游標分頁，上一頁的最後一個條目，
+                或 (last_edited_time, id) 元組
+            types (list): 只返回這些類型的條目
+            space_id (str): 只返回該空間的條目
 
         Returns:
             list: 條目列表
@@ -31,31 +53,23 @@ class NotionDatabaseReader:
         try:
             conn = self.connect()
             cursor = conn.cursor()
-            
-            query = """
-                WITH RECURSIVE page_hierarchy AS (
-                    SELECT
-                        id,
-                        parent_id,
-                        type,
-                        properties,
-                        1 as level,
-                        id as root_page_id
-                    FROM block
-                    WHERE parent_table = 'space'
-                    
-                    UNION ALL
-                    
-                    SELECT
-                        b.id,
-                        b.parent_id,
-                        b.type,
-                        b.properties,
-                        h.level + 1,
-                        h.root_page_id
-                    FROM block b
-                    JOIN page_hierarchy h ON h.id = b.parent_id
-                )
+
+            conditions = ["last_edited_time IS NOT NULL"]
+            params = []
+            if types:
+                conditions.append(f"block.type IN ({', '.join('?' * len(types))})")
+                params.extend(types)
+            if space_id:
+                conditions.append("space_id = ?")
+                params.append(space_id)
+            if after is not None:
+                if isinstance(after, Block):
+                    after = (after.raw_value('last_edited_time'), after['id'])
+                conditions.append("(last_edited_time, block.id) < (?, ?)")
+                params.extend(after)
+            params.extend([limit, offset])
+
+            query = f"""
                 SELECT DISTINCT
                     block.id,
                     space_id,
@@ -68,54 +82,113 @@ class NotionDatabaseReader:
                     name AS "created_by_name",
                     last_edited_time,
                     last_edited_by,
-                    block.parent_id,
-                    ph.root_page_id,
-                    ph.level
+                    block.parent_id
                 FROM
                     block
-                LEFT JOIN page_hierarchy ph ON block.id = ph.id
                 INNER JOIN
                     notion_user
                 ON
                     notion_user.id = block.created_by_id
                 WHERE
-                    last_edited_time IS NOT NULL
+                    {' AND '.join(conditions)}
                 ORDER BY
-                    last_edited_time DESC
-                LIMIT 20
+                    last_edited_time DESC, block.id DESC
+                LIMIT ? OFFSET ?
             """
-            
-            cursor.execute(query)
-            columns = [description[0] for description in cursor.description]
-            entries = []
-            
-            for row in cursor.fetchall():
-                entry = dict(zip(columns, row))
-                
-                # 轉換時間戳
-                if entry['created_time']:
-                    entry['created_time'] = datetime.fromtimestamp(entry['created_time'] / 1000)
-                if entry['last_edited_time']:
-                    entry['last_edited_time'] = datetime.fromtimestamp(entry['last_edited_time'] / 1000)
-                
-                # 解析properties JSON
-                if entry['properties']:
-                    try:
-                        entry['properties'] = json.loads(entry['properties'])
-                    except json.JSONDecodeError:
-                        entry['properties'] = None
-                
-                entries.append(entry)
-            
+
+            with PROFILER.span('entries.query') as span:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                span.count('rows', len(rows))
+            columns = Block.columns(list(cursor.description) + [('root_page_id',), ('level',)])
+
+            with PROFILER.span('entries.roots') as span:
+                block_ids = [row[0] for row in rows]
+                if self.hierarchy is not None:
+                    roots = self.hierarchy.roots(block_ids)
+                else:
+                    roots = self._resolve_roots(cursor, block_ids)
+                if span:
+                    span.maximum('max_depth', max((level for _, level in roots.values()), default=0))
+
+            # 以 Block 包裝每一行，JSON 與時間戳在首次讀取時才解析
+            entries = [Block(columns, row + roots.get(row[0], (None, None))) for row in rows]
+
             return entries
-            
+
         except sqlite3.Error as e:
             raise Exception(f"查詢數據庫時發生錯誤：{str(e)}")
-        finally:
-            conn.close()
+
+    def _resolve_roots(self, cursor, block_ids):
+        """向上追溯祖先，求出每個條目的頂層頁面與層級
+
+        每一層祖先以一次批量查詢取得，已經解析過的祖先會被記住，
+        共用祖先的條目不會重複查詢。與空間直接相連（parent_table = 'space'）
+        的區塊為第 1 層。
+
+        Args:
+            cursor (sqlite3.Cursor): 數據庫游標
+            block_ids (list): 區塊ID列表
+
+        Returns:
+            dict: 區塊ID -> (root_page_id, level)，無法追溯到空間的區塊不包含在內
+        """
+        parents = {}
+        pending = set(block_ids)
+        while pending:
+            pending = list(pending)
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                cursor.execute(f"""
+                    SELECT id, parent_id, parent_table
+                    FROM block
+                    WHERE id IN ({', '.join('?' * len(chunk))})
+                """, chunk)
+                for block_id, parent_id, parent_table in cursor.fetchall():
+                    parents[block_id] = (parent_id, parent_table)
+
+            next_pending = set()
+            for block_id in pending:
+                parent = parents.setdefault(block_id, None)
+                if parent and parent[1] != 'space' and parent[0] not in parents:
+                    next_pending.add(parent[0])
+            pending = next_pending
+
+        resolved = {}
+        for block_id in block_ids:
+            chain = []
+            seen = set()
+            current = block_id
+            result = None
+            while current is not None:
+                if current in resolved:
+                    result = resolved[current]
+                    break
+                parent = parents.get(current)
+                # 不存在的區塊或循環引用都無法追溯到空間
+                if parent is None or current in seen:
+                    break
+                chain.append(current)
+                seen.add(current)
+                if parent[1] == 'space':
+                    result = (current, 0)
+                    break
+                current = parent[0]
+
+            # 沿著追溯鏈回填，讓其他條目可以直接使用
+            for depth, ancestor in enumerate(reversed(chain), 1):
+                resolved[ancestor] = (result[0], result[1] + depth) if result else None
+
+        return {block_id: resolved[block_id] for block_id in block_ids if resolved.get(block_id)}
 
 def main():
     """主函數"""
+    parser = argparse.ArgumentParser(description='列出 Notion 中最近修改的條目')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.profile:
+        PROFILER.enable(cprofile=args.profile_cprofile, memory=args.profile_memory)
     db_path = "/Users/ronnie/Library/Application Support/Notion/notion.db"
     try:
         reader = NotionDatabaseReader(db_path)
@@ -141,6 +214,11 @@ def main():
             
     except Exception as e:
         print(f"錯誤：{str(e)}")
+    finally:
+        if args.profile:
+            PROFILER.disable()
+            PROFILER.dump(args.profile)
+            PROFILER.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import sqlite3
+import json
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """LRU cache of rendered Markdown, optionally backed by a SQLite file
+
+    Keys are strings built from block versions, so an entry never goes stale:
+    a changed block simply produces a new key and the old entry ages out.
+    Values must be JSON serialisable when a disk store is used.
+
+    The disk store keeps at most max_disk_entries rows, dropping the oldest
+    written first, and commits every commit_every writes. A store written
+    under another version is emptied when opened.
+    """
+
+    def __init__(self, max_entries=100000, path=None, version=None, max_disk_entries=1000000,
+                 commit_every=1000):
+        """Initialise RenderCache
+
+        Args:
+            max_entries (int): Maximum number of entries kept in memory
+            path (str): Optional SQLite file persisting entries across runs
+            version: Version of what is cached, e.g. RENDER_VERSION; entries
+                stored under another version are deleted when opening
+            max_disk_entries (int): Maximum number of rows kept on disk
+            commit_every (int): Writes between commits to the disk store
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.commit_every = commit_every
+        self._pending = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_writes = 0
+
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode = WAL")
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS render_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS render_cache_state (
+                    key TEXT PRIMARY KEY,
+                    value
+                )
+            """)
+            if version is not None:
+                row = self._disk.execute("SELECT value FROM render_cache_state WHERE key = 'version'").fetchone()
+                if row is None or row[0] != str(version):
+                    self._disk.execute("DELETE FROM render_cache")
+                    self._disk.execute("INSERT OR REPLACE INTO render_cache_state (key, value) VALUES ('version', ?)",
+                                       (str(version),))
+            self._disk.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._disk is not None:
+                row = self._disk.execute("SELECT value FROM render_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = json.loads(row[0])
+                    self._store(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Cache a value, writing it through to the disk store if any
+
+        Args:
+            key (str): Cache key
+            value: Value to cache, not None
+        """
+        with self._lock:
+            self._store(key, value)
+            if self._disk is not None:
+                self._disk.execute("INSERT OR REPLACE INTO render_cache (key, value) VALUES (?, ?)",
+                                   (key, json.dumps(value, ensure_ascii=False)))
+                self.disk_writes += 1
+                self._pending += 1
+                if self._pending >= self.commit_every:
+                    self._commit()
+
+    def _commit(self):
+        """Trim the disk store to max_disk_entries and commit, with the lock held
+
+        A replaced row gets a new rowid, so rowid order is write order and
+        the rows below the newest max_disk_entries rowids are the oldest.
+        """
+        self._disk.execute("""
+            DELETE FROM render_cache
+            WHERE rowid <= (SELECT max(rowid) FROM render_cache) - ?
+        """, (self.max_disk_entries,))
+        self._disk.commit()
+        self._pending = 0
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit, miss and eviction counters
+
+        Returns:
+            dict: Counters plus current size and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_hits': self.disk_hits,
+                'disk_writes': self.disk_writes,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop every entry, in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM render_cache")
+                self._disk.commit()
+
+    def flush(self):
+        """Commit pending writes to the disk store"""
+        with self._lock:
+            if self._disk is not None:
+                self._commit()
+
+    def close(self):
+        """Flush and close the disk store"""
+        self.flush()
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
@@ -1,79 +1,202 @@
 import sqlite3
+import copy
 import os
+import sys
 import json
+import argparse
 from textwrap import indent
 
+from notion_connection import shared_connection
+from notion_profile import PROFILER, add_profile_arguments
+
+# 所有表的列、索引與外鍵，每個表內保持 PRAGMA 的順序
+CATALOG_QUERY = """
+    SELECT m.name, 'column', c.cid, c.name, c.type, c."notnull", c.dflt_value, c.pk, NULL, NULL
+    FROM sqlite_master m, pragma_table_info(m.name) c
+    WHERE m.type = 'table'
+    UNION ALL
+    SELECT m.name, 'index', i.seq, i.name, i."unique", i.origin, i.partial, NULL, NULL, NULL
+    FROM sqlite_master m, pragma_index_list(m.name) i
+    WHERE m.type = 'table'
+    UNION ALL
+    SELECT m.name, 'foreign_key', f.id, f.seq, f."table", f."from", f."to", f.on_update, f.on_delete, f."match"
+    FROM sqlite_master m, pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table'
+"""
+
+# (數據庫路徑, 是否快照) -> (schema_version, 目錄)
+_CATALOG_CACHE = {}
+
+
+def _quote(name):
+    """引用 SQL 標識符"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sample_value(column):
+    """示例數據的 SQL 表達式：文本與 BLOB 類型的列只讀出前 ? 個字符或字節"""
+    if any(word in (column['type'] or '').upper() for word in ('CHAR', 'CLOB', 'TEXT', 'BLOB')):
+        return f"substr({_quote(column['name'])}, 1, ?)"
+    return _quote(column['name'])
+
+
+def _truncate(value, max_length):
+    if isinstance(value, (str, bytes)) and len(value) > max_length:
+        return value[:max_length - 3] + ('...' if isinstance(value, str) else b'...')
+    return value
+
 class NotionSchemaReader:
-    def __init__(self, db_path):
+    def __init__(self, db_path, immutable=False, snapshot=False):
         """初始化NotionSchemaReader
 
         Args:
             db_path (str): Notion數據庫文件的路徑
+            immutable (bool): 以 immutable 模式打開數據庫
+            snapshot (bool): 從數據庫的私有快照讀取
         """
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"找不到數據庫文件：{db_path}")
         
         self.db_path = db_path
+        self.connection = shared_connection(db_path, immutable=immutable, snapshot=snapshot)
     
-    def get_tables(self):
+    def get_tables(self, samples=True, sample_rows=3, max_length=50):
         """獲取所有表的信息
-        
+
+        列、索引與外鍵以一次目錄查詢取得（見 get_catalog），
+        結構與逐表 PRAGMA 的結果相同。
+
+        Args:
+            samples (bool): 是否取得示例數據
+            sample_rows (int): 每個表的示例行數
+            max_length (int): 示例數據中文本的最大長度，超過時截斷並加上 ...
+
         Returns:
             list: 表信息列表
         """
-        conn = None
+        results = []
+        for table in self.get_catalog(samples, sample_rows, max_length):
+            results.append({
+                'name': table['name'],
+                'columns': [
+                    (column['cid'], column['name'], column['type'], column['notnull'], column['default'], column['pk'])
+                    for column in table['columns']
+                ],
+                'indexes': [
+                    (index['seq'], index['name'], index['unique'], index['origin'], index['partial'])
+                    for index in table['indexes']
+                ],
+                'foreign_keys': [
+                    (fk['id'], fk['seq'], fk['table'], fk['from'], fk['to'], fk['on_update'], fk['on_delete'],
+                     fk['match'])
+                    for fk in table['foreign_keys']
+                ],
+                'sample_data': [tuple(row) for row in table.get('sample_data', [])],
+            })
+        return results
+
+    def get_catalog(self, samples=False, sample_rows=3, max_length=50):
+        """以少量查詢獲取數據庫目錄
+
+        所有表的列、索引與外鍵由 pragma_table_info、pragma_index_list 與
+        pragma_foreign_key_list 表值函數和 sqlite_master 連接後一次查出，
+        行數取自 sqlite_stat1 的估計值（未執行過 ANALYZE 時為 None），不掃描表。
+        結果以 PRAGMA schema_version 為指紋緩存在進程內，架構未變時重複調用
+        只需一條語句。示例數據不緩存，文本與 BLOB 在 SQL 中截斷，
+        不會完整讀出 crdt_data、properties 等大字段。
+
+        Args:
+            samples (bool): 是否取得示例數據
+            sample_rows (int): 每個表的示例行數
+            max_length (int): 示例數據中文本的最大長度，超過時截斷並加上 ...
+
+        Returns:
+            list: 每個表一個字典，包含 name、row_count、columns、indexes、
+                  foreign_keys，以及 samples 為 True 時的 sample_data
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 獲取所有表名
-            cursor.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' 
-                ORDER BY name;
-            """)
-            tables = cursor.fetchall()
-            
-            results = []
-            for (table_name,) in tables:
-                # 獲取表結構
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                
-                # 獲取索引信息
-                cursor.execute(f"PRAGMA index_list({table_name})")
-                indexes = cursor.fetchall()
-                
-                # 獲取外鍵信息
-                cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-                foreign_keys = cursor.fetchall()
-                
-                # 獲取示例數據（最多3行）
-                try:
-                    cursor.execute(f"SELECT * FROM {table_name} LIMIT 3")
-                    sample_data = cursor.fetchall()
-                except sqlite3.Error:
-                    sample_data = []
-                
-                results.append({
-                    'name': table_name,
-                    'columns': columns,
-                    'indexes': indexes,
-                    'foreign_keys': foreign_keys,
-                    'sample_data': sample_data
-                })
-            
-            return results
-            
+            conn = self.connection.connection()
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            key = (self.connection.db_path, self.connection.snapshot)
+            cached = _CATALOG_CACHE.get(key)
+            if cached is None or cached[0] != schema_version:
+                with PROFILER.span('schema.catalog'):
+                    cached = _CATALOG_CACHE[key] = (schema_version, self._read_catalog(conn))
+            # 深拷貝：調用方修改 columns 等列表時不會改動緩存
+            tables = copy.deepcopy(cached[1])
+
+            if samples:
+                with PROFILER.span('schema.sample') as span:
+                    sample_data = self._read_samples(conn, tables, sample_rows, max_length)
+                    for table in tables:
+                        table['sample_data'] = sample_data.get(table['name'], [])
+                        span.count('rows', len(table['sample_data']))
+            return tables
+
         except sqlite3.Error as e:
             raise Exception(f"查詢數據庫時發生錯誤：{str(e)}")
-        finally:
-            if conn:
-                conn.close()
-    
-    def print_schema(self):
-        """打印數據庫架構"""
-        tables = self.get_tables()
+
+    def _read_catalog(self, conn):
+        """一次查詢讀出所有表的列、索引與外鍵，並附上 sqlite_stat1 的行數估計"""
+        tables = {}
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+            tables[name] = {'name': name, 'row_count': None, 'columns': [], 'indexes': [], 'foreign_keys': []}
+
+        for row in conn.execute(CATALOG_QUERY):
+            table = tables[row[0]]
+            kind = row[1]
+            if kind == 'column':
+                table['columns'].append(dict(zip(('cid', 'name', 'type', 'notnull', 'default', 'pk'), row[2:8])))
+            elif kind == 'index':
+                table['indexes'].append(dict(zip(('seq', 'name', 'unique', 'origin', 'partial'), row[2:7])))
+            else:
+                table['foreign_keys'].append(dict(zip(
+                    ('id', 'seq', 'table', 'from', 'to', 'on_update', 'on_delete', 'match'), row[2:10])))
+
+        if 'sqlite_stat1' in tables:
+            # stat 的第一個數字是表的行數估計，各索引的估計相同
+            for name, row_count in conn.execute("""
+                SELECT tbl, MAX(CAST(stat AS INTEGER))
+                FROM sqlite_stat1
+                GROUP BY tbl
+            """):
+                if name in tables:
+                    tables[name]['row_count'] = row_count
+        return list(tables.values())
+
+    def _read_samples(self, conn, tables, sample_rows, max_length):
+        """取得所有表的示例數據
+
+        文本與 BLOB 列在 SQL 中只取 max_length + 1 個字符，
+        大字段不會完整讀出；超長的值再截斷並加上 ...
+
+        Returns:
+            dict: 表名 -> 行列表
+        """
+        sample_data = {}
+        for table in tables:
+            expressions = [_sample_value(column) for column in table['columns']]
+            if not expressions:
+                continue
+            params = [max_length + 1] * sum('?' in expression for expression in expressions) + [sample_rows]
+            try:
+                rows = conn.execute(
+                    f"SELECT {', '.join(expressions)} FROM {_quote(table['name'])} LIMIT ?", params).fetchall()
+            except sqlite3.Error:
+                # 無法讀取的表（例如缺少模塊的虛擬表）沒有示例數據
+                continue
+            sample_data[table['name']] = [[_truncate(value, max_length) for value in row] for row in rows]
+        return sample_data
+
+    def print_schema(self, samples=True, sample_rows=3, max_length=50):
+        """打印數據庫架構
+
+        Args:
+            samples (bool): 是否打印示例數據
+            sample_rows (int): 每個表的示例行數
+            max_length (int): 示例數據中文本的最大長度
+        """
+        tables = self.get_tables(samples, sample_rows, max_length)
         
         for table in tables:
             print(f"\n{'='*80}")
@@ -110,25 +233,40 @@ class NotionSchemaReader:
                 print("\n示例數據:")
                 print("-"*40)
                 for row in table['sample_data']:
-                    formatted_row = []
-                    for item in row:
-                        if isinstance(item, str) and len(item) > 50:
-                            formatted_row.append(f"{item[:47]}...")
-                        else:
-                            formatted_row.append(str(item))
-                    print(f"| {' | '.join(formatted_row)} |")
+                    # 超長的值已在 get_tables 中截斷
+                    print(f"| {' | '.join(map(str, row))} |")
             
             print()
 
 def main():
     """主函數"""
-    db_path = "/Users/ronnie/Library/Application Support/Notion/notion.db"
-    
+    parser = argparse.ArgumentParser(description='打印 Notion 數據庫的架構')
+    parser.add_argument('--db', default="/Users/ronnie/Library/Application Support/Notion/notion.db",
+                        help='數據庫文件的路徑')
+    parser.add_argument('--json', action='store_true', help='以 JSON 輸出目錄')
+    parser.add_argument('--no-samples', action='store_true', help='不取得示例數據')
+    parser.add_argument('--sample-rows', type=int, default=3, help='每個表的示例行數')
+    parser.add_argument('--max-length', type=int, default=50, help='示例數據中文本的最大長度')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.profile:
+        PROFILER.enable(cprofile=args.profile_cprofile, memory=args.profile_memory)
     try:
-        reader = NotionSchemaReader(db_path)
-        reader.print_schema()
+        reader = NotionSchemaReader(os.path.expanduser(args.db))
+        if args.json:
+            catalog = reader.get_catalog(not args.no_samples, args.sample_rows, args.max_length)
+            json.dump(catalog, sys.stdout, ensure_ascii=False, indent=2, default=repr)
+            print()
+        else:
+            reader.print_schema(not args.no_samples, args.sample_rows, args.max_length)
     except Exception as e:
         print(f"錯誤：{str(e)}")
+    finally:
+        if args.profile:
+            PROFILER.disable()
+            PROFILER.dump(args.profile)
+            PROFILER.stop()
 
 if __name__ == "__main__":
     main()
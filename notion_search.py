@@ -0,0 +1,332 @@
+import sqlite3
+import json
+import os
+import re
+import argparse
+
+from notion_connection import shared_connection
+from notion_page_reader import PAGE_TYPES, owning_pages
+
+DEFAULT_TOKENIZE = 'unicode61 remove_diacritics 2'
+# Built-in FTS5 tokenizers; porter wraps another one, e.g. 'porter unicode61'
+FTS5_TOKENIZERS = ('unicode61', 'ascii', 'porter', 'trigram')
+
+
+def extract_text(block_type, properties):
+    """Extract the plain text of a block for indexing
+
+    Uses properties.title, or every cell of a table_row. Link targets are
+    appended after the linked text so URLs are searchable too.
+
+    Args:
+        block_type (str): Block type
+        properties (dict): Decoded block properties
+
+    Returns:
+        str: Plain text, empty if the block has none
+    """
+    if not isinstance(properties, dict):
+        return ""
+    if block_type == 'table_row':
+        values = properties.values()
+    else:
+        values = [properties.get('title')]
+
+    cells = []
+    for rich_text in values:
+        if not isinstance(rich_text, list):
+            continue
+        parts = []
+        for part in rich_text:
+            if not isinstance(part, list) or not part:
+                continue
+            parts.append(str(part[0]))
+            if len(part) == 2 and isinstance(part[1], list):
+                for fmt in part[1]:
+                    if isinstance(fmt, list) and len(fmt) == 2 and fmt[0] == 'a':
+                        parts.append(f" {fmt[1]} ")
+        cells.append("".join(parts).strip())
+    return " ".join(cell for cell in cells if cell)
+
+
+class NotionSearchIndex:
+    """FTS5 full-text index over block text, kept in a sidecar database
+
+    Each indexed block stores its text, block id, owning page id (nearest
+    ancestor of a page type) and type. update() re-indexes only blocks whose
+    last_edited_time moved past the stored watermark, or whose version
+    changed when they have none, and drops blocks that are no longer alive.
+    """
+
+    def __init__(self, db_path, index_path, tokenize=DEFAULT_TOKENIZE):
+        """Initialise NotionSearchIndex
+
+        Args:
+            db_path (str): Notion database (or mirror) to index
+            index_path (str): Sidecar index database, created if missing
+            tokenize (str): FTS5 tokenizer, e.g. 'trigram' for CJK substring search.
+                It is written into the table definition, so only a built-in
+                tokenizer followed by bare-word arguments is accepted.
+        """
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+        words = tokenize.split()
+        if not words or words[0] not in FTS5_TOKENIZERS or not all(re.fullmatch(r'\w+', word) for word in words):
+            raise ValueError(f"Unsupported FTS5 tokenizer: {tokenize!r}, expected one of {', '.join(FTS5_TOKENIZERS)}"
+                             " followed by bare-word arguments")
+        self.db_path = db_path
+        self.index_path = index_path
+        self.tokenize = tokenize
+        self.connection = shared_connection(db_path)
+
+    def connect(self, rebuild=False):
+        """Open the sidecar index database, creating its tables if needed
+
+        The tokenizer is recorded in index_state. An index built with another
+        one is only rebuilt with it when rebuild is set, otherwise opening fails.
+
+        Args:
+            rebuild (bool): Recreate the text table if its tokenizer differs
+        """
+        try:
+            conn = sqlite3.connect(self.index_path)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_state (
+                    key TEXT PRIMARY KEY,
+                    value
+                )
+            """)
+            row = conn.execute("SELECT value FROM index_state WHERE key = 'tokenize'").fetchone()
+            if row:
+                tokenize = row[0]
+            else:
+                # Indexes from before the tokenizer was recorded have it only in their DDL
+                row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'block_text'").fetchone()
+                match = re.search(r"tokenize = '([^']*)'", row[0]) if row else None
+                tokenize = match.group(1) if match else None
+            if tokenize is not None and tokenize != self.tokenize:
+                if not rebuild:
+                    conn.close()
+                    raise Exception(f"Search index {self.index_path} uses tokenizer '{tokenize}', "
+                                    f"not '{self.tokenize}'; rebuild it to change tokenizer")
+                conn.execute("DROP TABLE block_text")
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS block_text USING fts5(
+                    text,
+                    block_id UNINDEXED,
+                    page_id UNINDEXED,
+                    type UNINDEXED,
+                    tokenize = '{self.tokenize}'
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS indexed_block (
+                    block_id TEXT PRIMARY KEY,
+                    text_rowid INTEGER NOT NULL
+                )
+            """)
+            # Blocks without a last_edited_time never reach the watermark; their versions are compared instead
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS untimed_block (
+                    block_id TEXT PRIMARY KEY,
+                    version INTEGER
+                )
+            """)
+            conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('tokenize', ?)", (self.tokenize,))
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening search index: {e}")
+
+    def _repage_descendants(self, conn, source, block_ids, known):
+        """Recompute the page of indexed blocks beneath blocks that changed
+
+        A block moved to another page takes its descendants with it, although
+        they were not edited. The descendants short of a child page are found
+        in one recursive query, and those indexed with another page updated.
+
+        Returns:
+            int: Number of blocks whose page changed
+        """
+        if not block_ids:
+            return 0
+        placeholders = ', '.join('?' * len(PAGE_TYPES))
+        descendants = [row[0] for row in source.execute(f"""
+            WITH RECURSIVE below(id) AS (
+                SELECT value FROM json_each(?)
+                UNION
+                SELECT b.id
+                FROM below
+                INNER JOIN block b ON b.parent_id = below.id
+                WHERE b.type NOT IN ({placeholders})
+            )
+            SELECT id FROM below
+        """, (json.dumps(block_ids), *PAGE_TYPES))]
+        rows = conn.execute("""
+            SELECT t.rowid, t.block_id, t.page_id
+            FROM indexed_block i
+            INNER JOIN block_text t ON t.rowid = i.text_rowid
+            WHERE i.block_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(descendants),)).fetchall()
+        pages = owning_pages(source, [block_id for _, block_id, _ in rows], known)
+        updates = [(pages[block_id], text_rowid) for text_rowid, block_id, page_id in rows
+                   if pages[block_id] != page_id]
+        conn.executemany("UPDATE block_text SET page_id = ? WHERE rowid = ?", updates)
+        return len(updates)
+
+    def update(self, rebuild=False):
+        """Index blocks changed since the last update
+
+        Blocks whose last_edited_time reached the watermark are indexed again,
+        as are blocks without one whose version changed. After an incremental
+        update the indexed descendants of changed blocks get their page
+        recomputed, in case an ancestor moved.
+
+        Args:
+            rebuild (bool): Drop the index and index every block again, also
+                with a tokenizer other than the one the index was built with
+
+        Returns:
+            dict: {'indexed': int, 'removed': int, 'moved': int}
+        """
+        conn = self.connect(rebuild=rebuild)
+        try:
+            if rebuild:
+                conn.execute("DELETE FROM block_text")
+                conn.execute("DELETE FROM indexed_block")
+                conn.execute("DELETE FROM untimed_block")
+                conn.execute("DELETE FROM index_state WHERE key = 'watermark'")
+            row = conn.execute("SELECT value FROM index_state WHERE key = 'watermark'").fetchone()
+            watermark = row[0] if row else None
+            untimed = dict(conn.execute("SELECT block_id, version FROM untimed_block"))
+
+            source = self.connection.connection()
+            cursor = source.execute("""
+                SELECT id, type, properties, alive, last_edited_time, version
+                FROM block
+                WHERE last_edited_time >= ? OR last_edited_time IS NULL
+                ORDER BY last_edited_time
+            """, (watermark if watermark is not None else float('-inf'),))
+
+            known = {}
+            indexed = removed = moved = 0
+            new_watermark = watermark
+            while True:
+                batch = cursor.fetchmany(1000)
+                if not batch:
+                    break
+                for row in batch:
+                    if row[4] is not None:
+                        new_watermark = row[4]
+                # The last row of a block cached once per meta_user_id wins
+                rows = [row for row in {row[0]: row for row in batch}.values()
+                        if row[4] is not None or untimed.get(row[0]) != row[5]]
+                if not rows:
+                    continue
+                ids = json.dumps([row[0] for row in rows])
+
+                old = dict(conn.execute("""
+                    SELECT block_id, text_rowid FROM indexed_block
+                    WHERE block_id IN (SELECT value FROM json_each(?))
+                """, (ids,)))
+                if old:
+                    conn.execute("DELETE FROM block_text WHERE rowid IN (SELECT value FROM json_each(?))",
+                                 (json.dumps(list(old.values())),))
+                    conn.execute("DELETE FROM indexed_block WHERE block_id IN (SELECT value FROM json_each(?))",
+                                 (json.dumps(list(old)),))
+                conn.execute("DELETE FROM untimed_block WHERE block_id IN (SELECT value FROM json_each(?))", (ids,))
+                conn.executemany("INSERT INTO untimed_block (block_id, version) VALUES (?, ?)",
+                                 [(row[0], row[5]) for row in rows if row[4] is None])
+
+                pages = owning_pages(source, [row[0] for row in rows if row[3] == 1], known)
+                for block_id, block_type, properties, alive, last_edited_time, version in rows:
+                    text = ""
+                    if alive == 1 and properties:
+                        try:
+                            text = extract_text(block_type, json.loads(properties))
+                        except json.JSONDecodeError:
+                            pass
+                    if text:
+                        text_rowid = conn.execute(
+                            "INSERT INTO block_text (text, block_id, page_id, type) VALUES (?, ?, ?, ?)",
+                            (text, block_id, pages.get(block_id), block_type),
+                        ).lastrowid
+                        conn.execute("INSERT INTO indexed_block (block_id, text_rowid) VALUES (?, ?)", (block_id, text_rowid))
+                        indexed += 1
+                    elif block_id in old:
+                        removed += 1
+
+                if watermark is not None:
+                    moved += self._repage_descendants(
+                        conn, source, [row[0] for row in rows if row[3] == 1 and row[1] not in PAGE_TYPES], known)
+
+            conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('watermark', ?)", (new_watermark,))
+            conn.commit()
+            return {'indexed': indexed, 'removed': removed, 'moved': moved}
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise Exception(f"Error updating search index: {e}")
+        finally:
+            conn.close()
+
+    def search(self, query, limit=20):
+        """Search block text, best matches first
+
+        Args:
+            query (str): FTS5 query, e.g. 'notion AND markdown' or '"exact phrase"'
+            limit (int): Maximum number of hits
+
+        Returns:
+            list: Hits as dicts with block_id, page_id, type, snippet and rank
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute("""
+                SELECT
+                    block_id,
+                    page_id,
+                    type,
+                    snippet(block_text, 0, '**', '**', '…', 16),
+                    rank
+                FROM block_text
+                WHERE block_text MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (query, limit)).fetchall()
+            return [
+                {'block_id': block_id, 'page_id': page_id, 'type': block_type, 'snippet': snippet, 'rank': rank}
+                for block_id, page_id, block_type, snippet, rank in rows
+            ]
+        except sqlite3.Error as e:
+            raise Exception(f"Error searching index: {e}")
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search over Notion block text')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to index, e.g. a mirror synced by sqldb.py')
+    parser.add_argument('--index', default="notion_search.db", help='Sidecar search index database')
+    parser.add_argument('--tokenize', default=DEFAULT_TOKENIZE, help="FTS5 tokenizer, e.g. 'trigram' for CJK")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help='Index blocks changed since the last update')
+    update_parser.add_argument('--rebuild', action='store_true', help='Rebuild the whole index')
+    search_parser = subparsers.add_parser('search', help='Search the index')
+    search_parser.add_argument('query', help='FTS5 query')
+    search_parser.add_argument('-n', '--limit', type=int, default=20, help='Maximum number of hits')
+    args = parser.parse_args()
+
+    index = NotionSearchIndex(os.path.expanduser(args.db), args.index, tokenize=args.tokenize)
+    if args.command == 'update':
+        stats = index.update(rebuild=args.rebuild)
+        print(f"Indexed {stats['indexed']} blocks, removed {stats['removed']}, "
+              f"moved {stats['moved']} to another page")
+    else:
+        for hit in index.search(args.query, limit=args.limit):
+            print(f"{hit['page_id']}  {hit['block_id']}  [{hit['type']}]  {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import sqlite3
+import json
+import hashlib
+import os
+import sys
+import time
+import argparse
+
+from notion_markdown import RENDER_VERSION
+from notion_page_reader import NotionPageReader, PAGE_TYPES, owning_pages
+from notion_render_cache import RenderCache
+
+
+def _file_signature(path):
+    """(mtime_ns, size) of a file, or None when it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class NotionWatcher:
+    """Watch a Notion database and re-render the pages whose blocks change
+
+    Polling is layered so an idle database costs a few stat() calls:
+
+    1. the mtime and size of the database file and its -wal file are
+       compared with the previous poll, and nothing else runs while they
+       are unchanged;
+    2. on a change, blocks whose last_edited_time reached the watermark are
+       read, together with the block pointers of new rows of transactions
+       and the pages named by new rows of offline_action, when the
+       database has those tables;
+    3. changed blocks are mapped to their owning pages by walking up their
+       ancestors (see owning_pages); a block that moved out of a rendered
+       page marks that page as well, and a changed child page marks the
+       page listing it;
+    4. the affected pages are fetched in one batch and re-rendered, reusing
+       cached renders of unchanged blocks, and an event is emitted for
+       every page whose Markdown changed.
+    """
+
+    def __init__(self, db_path, page_ids=None, output_dir=None, interval=0.2, debug=False,
+                 cache=None, callback=None):
+        """Initialise NotionWatcher
+
+        Args:
+            db_path (str): Path to the Notion database file
+            page_ids (list): Pages to watch, every page when omitted
+            output_dir (str): Write each re-rendered page to <page_id>.md here
+            interval (float): Seconds between polls
+            debug (bool): Render in debug mode
+            cache (RenderCache): Render cache, an in-memory one by default
+            callback (callable): Called with each event dict, defaults to
+                printing it as a JSON line on stdout
+        """
+        self.reader = NotionPageReader(db_path, cache=cache if cache is not None else RenderCache())
+        self.db_path = self.reader.connection.db_path
+        self.page_ids = set(page_ids) if page_ids else None
+        self.output_dir = output_dir
+        self.interval = interval
+        self.debug = debug
+        self.callback = callback or self._print_event
+
+        self._signature = None
+        self._watermark = None
+        self._edge = {}
+        self._transaction_time = None
+        self._action_id = None
+        self._tables = None
+        self._known = {}
+        self._page_blocks = {}
+        self._block_pages = {}
+        self._digests = {}
+
+    @staticmethod
+    def _print_event(event):
+        sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    def _signature_now(self):
+        return _file_signature(self.db_path), _file_signature(self.db_path + "-wal")
+
+    def start(self, render=True):
+        """Take the current watermarks and optionally render the watched pages
+
+        Changes made before start() are not reported.
+
+        Args:
+            render (bool): Render every watched page once, emitting its event
+        """
+        conn = self.reader.connect()
+        self._signature = self._signature_now()
+        self._tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('transactions', 'offline_action')")}
+        self._watermark, self._edge = self._block_watermark(conn)
+        if 'transactions' in self._tables:
+            self._transaction_time = conn.execute("SELECT MAX(timestamp) FROM transactions").fetchone()[0]
+        if 'offline_action' in self._tables:
+            self._action_id = conn.execute("SELECT MAX(id) FROM offline_action").fetchone()[0]
+        if render and self.page_ids:
+            return self._render(sorted(self.page_ids), {}, time.time()) or []
+        return []
+
+    def _block_watermark(self, conn):
+        """Latest last_edited_time and the versions of the blocks edited at it"""
+        watermark = conn.execute("SELECT MAX(last_edited_time) FROM block").fetchone()[0]
+        if watermark is None:
+            return None, {}
+        rows = conn.execute("SELECT id, version FROM block WHERE last_edited_time = ?", (watermark,))
+        return watermark, dict(rows.fetchall())
+
+    def _changed_blocks(self, conn):
+        """Blocks edited since the last poll, as block ID -> last_edited_time
+
+        last_edited_time is not unique, so rows at the watermark are read again
+        and skipped when their version was already seen there.
+        """
+        changed = {}
+        rows = conn.execute("""
+            SELECT id, version, last_edited_time
+            FROM block
+            WHERE last_edited_time >= ?
+        """, (self._watermark if self._watermark is not None else float('-inf'),)).fetchall()
+        watermark, edge = self._watermark, self._edge
+        for block_id, version, last_edited_time in rows:
+            if last_edited_time == self._watermark and self._edge.get(block_id) == version:
+                continue
+            changed[block_id] = last_edited_time
+            if watermark is None or last_edited_time > watermark:
+                watermark, edge = last_edited_time, {}
+            if last_edited_time == watermark:
+                edge[block_id] = version
+        self._watermark, self._edge = watermark, edge
+
+        if 'transactions' in self._tables:
+            rows = conn.execute("""
+                SELECT timestamp, operations
+                FROM transactions
+                WHERE timestamp > ?
+                ORDER BY timestamp
+            """, (self._transaction_time if self._transaction_time is not None else float('-inf'),)).fetchall()
+            for timestamp, operations in rows:
+                self._transaction_time = timestamp
+                try:
+                    operations = json.loads(operations)
+                except (TypeError, json.JSONDecodeError):
+                    continue
+                for operation in operations if isinstance(operations, list) else []:
+                    pointer = operation.get('pointer') if isinstance(operation, dict) else None
+                    if pointer and pointer.get('table') == 'block' and pointer.get('id'):
+                        changed.setdefault(pointer['id'], None)
+        return changed
+
+    def _changed_pages(self, conn):
+        """Pages named by offline_action rows added since the last poll"""
+        if 'offline_action' not in self._tables:
+            return set()
+        rows = conn.execute("""
+            SELECT id, origin_page_id, impacted_page_id
+            FROM offline_action
+            WHERE id > ?
+            ORDER BY id
+        """, (self._action_id if self._action_id is not None else -1,)).fetchall()
+        pages = set()
+        for action_id, origin_page_id, impacted_page_id in rows:
+            self._action_id = action_id
+            pages.update((origin_page_id, impacted_page_id))
+        return pages
+
+    def _affected_pages(self, conn, changed):
+        """Map changed blocks to the pages whose Markdown may have changed
+
+        Returns:
+            dict: Page ID -> list of changed block IDs
+        """
+        # Owners before the change, while the cached ancestors are still the old ones
+        affected = {}
+        for block_id in changed:
+            page_id = self._block_pages.get(block_id)
+            if page_id is not None:
+                affected.setdefault(page_id, []).append(block_id)
+
+        for block_id in changed:
+            self._known.pop(block_id, None)
+        owners = owning_pages(conn, list(changed), self._known)
+        for block_id, page_id in owners.items():
+            if page_id is not None:
+                affected.setdefault(page_id, []).append(block_id)
+            info = self._known.get(block_id)
+            # A child page is listed, with its title, by the page above it
+            if info and info[2] in PAGE_TYPES and info[1] == 'block' and info[0]:
+                parent_page = owning_pages(conn, [info[0]], self._known)[info[0]]
+                if parent_page is not None:
+                    affected.setdefault(parent_page, []).append(block_id)
+
+        if self.page_ids is not None:
+            affected = {page_id: ids for page_id, ids in affected.items() if page_id in self.page_ids}
+        return {page_id: list(dict.fromkeys(ids)) for page_id, ids in affected.items()}
+
+    def poll(self):
+        """Check the database once and re-render the pages affected by changes
+
+        Returns:
+            list: Events emitted by this poll
+        """
+        if self._signature is None:
+            self.start(render=False)
+        signature = self._signature_now()
+        if signature == self._signature:
+            return []
+        # Where this poll starts reading, restored when it has to be retried
+        previous = (self._signature, self._watermark, self._edge, self._transaction_time, self._action_id)
+        self._signature = signature
+        detected = time.time()
+
+        conn = self.reader.connect()
+        try:
+            changed = self._changed_blocks(conn)
+            affected = self._affected_pages(conn, changed) if changed else {}
+            for page_id in self._changed_pages(conn):
+                if self.page_ids is None or page_id in self.page_ids:
+                    affected.setdefault(page_id, [])
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise Exception(f"Error polling Notion database: {e}")
+            # The app holds the database mid-write, retry on the next poll
+            (self._signature, self._watermark, self._edge,
+             self._transaction_time, self._action_id) = previous
+            return []
+        if not affected:
+            return []
+        edited = {page_id: max((changed[block_id] for block_id in ids if changed.get(block_id)), default=None)
+                  for page_id, ids in affected.items()}
+        events = self._render(sorted(affected), affected, detected, edited)
+        if events is None:
+            # The pages could not be fetched, read the same changes again on the next poll
+            (self._signature, self._watermark, self._edge,
+             self._transaction_time, self._action_id) = previous
+            return []
+        return events
+
+    def _render(self, page_ids, affected, detected, edited=None):
+        """Re-render pages and emit an event for each one whose Markdown changed
+
+        Returns:
+            list: Events emitted, or None when the pages could not be fetched
+        """
+        pages = self.reader.get_pages_blocks(page_ids)
+        if pages is None:
+            return None
+        events = []
+        for page_id, blocks in pages.items():
+            for block_id in self._page_blocks.pop(page_id, ()):
+                if self._block_pages.get(block_id) == page_id:
+                    del self._block_pages[block_id]
+            block_ids = [block['id'] for block in blocks]
+            self._page_blocks[page_id] = block_ids
+            for block_id in block_ids:
+                self._block_pages[block_id] = page_id
+
+            lines = [f"# Page Content - {page_id}", ""]
+            lines.extend(self.reader.iter_page_markdown(blocks, self.debug))
+            markdown = "".join(f"{line}\n" for line in lines)
+            digest = hashlib.sha1(markdown.encode('utf-8')).hexdigest()
+            if self._digests.get(page_id) == digest:
+                continue
+            self._digests[page_id] = digest
+
+            path = None
+            if self.output_dir:
+                path = os.path.join(self.output_dir, f"{page_id}.md")
+                temp_path = f"{path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(markdown)
+                os.replace(temp_path, path)
+
+            now = time.time()
+            event = {
+                'event': 'page_rendered' if page_id in affected else 'page_loaded',
+                'page_id': page_id,
+                'blocks': len(blocks),
+                'changed_blocks': affected.get(page_id, []),
+                'digest': digest,
+                'path': path,
+                'render_ms': round((now - detected) * 1000, 1),
+            }
+            if edited and edited.get(page_id):
+                event['latency_ms'] = round(now * 1000 - edited[page_id], 1)
+            if not self.output_dir:
+                event['markdown'] = markdown
+            events.append(event)
+            self.callback(event)
+        return events
+
+    def run(self, max_polls=None):
+        """Poll until interrupted
+
+        Args:
+            max_polls (int): Stop after this many polls, run forever when None
+        """
+        if self._signature is None:
+            self.start()
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            self.poll()
+            polls += 1
+            time.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch a Notion database and re-render changed pages')
+    parser.add_argument('page_ids', nargs='*', help='Pages to watch, every page when omitted')
+    parser.add_argument('--db', default="~/Library/Application Support/Notion/notion.db",
+                        help='Database to watch')
+    parser.add_argument('-o', '--output-dir', help='Write re-rendered pages to <page_id>.md in this directory')
+    parser.add_argument('--interval', type=float, default=0.2, help='Seconds between polls')
+    parser.add_argument('--debug', action='store_true', help='Enable debug mode to show detailed info')
+    parser.add_argument('--cache', help='Persist rendered blocks in this file and reuse unchanged ones')
+    parser.add_argument('--no-initial', action='store_true', help='Do not render the watched pages on start')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    cache = RenderCache(path=args.cache, version=RENDER_VERSION) if args.cache else None
+    watcher = NotionWatcher(os.path.expanduser(args.db), page_ids=args.page_ids, output_dir=args.output_dir,
+                            interval=args.interval, debug=args.debug, cache=cache)
+    try:
+        watcher.start(render=not args.no_initial)
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
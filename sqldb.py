@@ -0,0 +1,234 @@
+import sqlite3
+import os
+import time
+import argparse
+from urllib.parse import quote
+
+from notion_connection import database_uri
+
+# Tables copied into the mirror, with the column used as incremental watermark.
+# Tables without one, and rows where it is NULL, are synced by comparing
+# (id, meta_user_id, version).
+MIRROR_TABLES = {
+    'block': 'last_edited_time',
+    'collection': None,
+    'notion_user': None,
+    'comment': 'last_edited_time',
+    'discussion': None,
+}
+
+# Indexes the Notion app does not have but our queries need, as (table, column)
+MIRROR_INDEXES = [
+    ('block', 'parent_id'),
+    ('block', 'last_edited_time'),
+    ('block', 'type'),
+    ('block', 'space_id'),
+    ('collection', 'space_id'),
+    ('comment', 'parent_id'),
+    ('comment', 'last_edited_time'),
+    ('discussion', 'parent_id'),
+]
+
+DEFAULT_SOURCE = "~/Library/Application Support/Notion/notion.db"
+DEFAULT_MIRROR = "notion_mirror.db"
+
+
+class NotionMirror:
+    """Incremental local mirror of the Notion app database
+
+    Copies block, collection, notion_user, comment and discussion from the
+    app's notion.db into a database we own, with our own indexes on
+    last_edited_time, type and space. The source is attached read-only and
+    only rows changed since the last sync are copied: rows whose
+    last_edited_time reached the table's watermark, or whose version differs
+    from the mirror where there is no last_edited_time to go by. Soft
+    deletions arrive as rows with alive = 0.
+
+    NotionPageReader and NotionDatabaseReader can be pointed at the mirror
+    path like any other Notion database.
+    """
+
+    def __init__(self, source_path, mirror_path):
+        """Initialise NotionMirror
+
+        Args:
+            source_path (str): Path to the Notion app database
+            mirror_path (str): Path to the mirror database, created if missing
+        """
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"Database file not found: {source_path}")
+        self.source_path = source_path
+        self.mirror_path = mirror_path
+
+    def connect(self):
+        """Open the mirror read-write with the source attached read-only as src"""
+        try:
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.mirror_path))}", uri=True,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("ATTACH DATABASE ? AS src", (database_uri(self.source_path),))
+            return conn
+        except sqlite3.Error as e:
+            raise Exception(f"Error opening mirror database: {e}")
+
+    def _columns(self, cursor, schema, table):
+        cursor.execute("SELECT name FROM pragma_table_info(?, ?)", (table, schema))
+        return [row[0] for row in cursor.fetchall()]
+
+    def _ensure_tables(self, cursor):
+        """Create missing mirror tables and add columns the app has gained"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT PRIMARY KEY,
+                watermark REAL,
+                synced_at REAL,
+                row_count INTEGER
+            )
+        """)
+        for table in MIRROR_TABLES:
+            cursor.execute("SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            row = cursor.fetchone()
+            if not row:
+                continue
+
+            mirror_columns = self._columns(cursor, 'main', table)
+            if not mirror_columns:
+                # Unqualified CREATE TABLE creates the table in main
+                cursor.execute(row[0])
+                continue
+
+            cursor.execute("SELECT name, type FROM pragma_table_info(?, 'src')", (table,))
+            for name, type_ in cursor.fetchall():
+                if name not in mirror_columns:
+                    cursor.execute(f'ALTER TABLE main."{table}" ADD COLUMN "{name}" {type_}')
+
+        for table, column in MIRROR_INDEXES:
+            if self._columns(cursor, 'main', table):
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS "mirror_{table}_{column}" ON "{table}"("{column}")')
+
+    def _sync_table(self, cursor, table, watermark_column, full):
+        """Copy changed rows of one table
+
+        Returns:
+            int: Number of rows copied
+        """
+        columns = [c for c in self._columns(cursor, 'src', table)
+                   if c in self._columns(cursor, 'main', table)]
+        if not columns:
+            return 0
+        quoted = [f'"{c}"' for c in columns]
+        insert = f'INSERT OR REPLACE INTO main."{table}" ({", ".join(quoted)})'
+        column_list = ", ".join(f's.{c}' for c in quoted)
+
+        cursor.execute("SELECT watermark FROM sync_state WHERE table_name = ?", (table,))
+        row = cursor.fetchone()
+        watermark = row[0] if row else None
+
+        if watermark_column and watermark is not None and not full:
+            # Rows at the watermark are copied again; timestamps are not unique.
+            # Rows without a timestamp never reach it and are compared by version.
+            cursor.execute(f"""
+                {insert}
+                SELECT {column_list}
+                FROM src."{table}" s
+                WHERE s."{watermark_column}" >= ?
+                   OR (s."{watermark_column}" IS NULL AND NOT EXISTS (
+                       SELECT 1 FROM main."{table}" m
+                       WHERE m.id = s.id AND m.meta_user_id = s.meta_user_id AND m.version IS s.version
+                   ))
+            """, (watermark,))
+        else:
+            cursor.execute(f"""
+                {insert}
+                SELECT {column_list}
+                FROM src."{table}" s
+                LEFT JOIN main."{table}" m
+                    ON m.id = s.id AND m.meta_user_id = s.meta_user_id
+                WHERE m.id IS NULL OR m.version IS NOT s.version
+            """)
+        copied = cursor.rowcount
+
+        if watermark_column:
+            cursor.execute(f'SELECT MAX("{watermark_column}") FROM main."{table}"')
+            watermark = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COUNT(*) FROM main."{table}"')
+        row_count = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT OR REPLACE INTO sync_state (table_name, watermark, synced_at, row_count)
+            VALUES (?, ?, ?, ?)
+        """, (table, watermark, time.time(), row_count))
+        return copied
+
+    def _prune_table(self, cursor, table):
+        """Delete mirror rows that no longer exist in the source
+
+        Returns:
+            int: Number of rows deleted
+        """
+        cursor.execute(f"""
+            DELETE FROM main."{table}"
+            WHERE NOT EXISTS (
+                SELECT 1 FROM src."{table}" s
+                WHERE s.id = main."{table}".id AND s.meta_user_id = main."{table}".meta_user_id
+            )
+        """)
+        return cursor.rowcount
+
+    def sync(self, full=False, prune=False):
+        """Bring the mirror up to date with the Notion app database
+
+        All tables are synced in one transaction, so they reflect the same
+        point in time of the source.
+
+        Args:
+            full (bool): Compare versions of every row instead of using the
+                last_edited_time watermarks
+            prune (bool): Also delete rows the app has dropped from its cache
+
+        Returns:
+            dict: Table name -> {'copied': int, 'deleted': int}
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_tables(cursor)
+                stats = {}
+                for table, watermark_column in MIRROR_TABLES.items():
+                    if not self._columns(cursor, 'main', table):
+                        continue
+                    copied = self._sync_table(cursor, table, watermark_column, full)
+                    deleted = self._prune_table(cursor, table) if prune else 0
+                    stats[table] = {'copied': copied, 'deleted': deleted}
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            return stats
+        except sqlite3.Error as e:
+            raise Exception(f"Error syncing mirror database: {e}")
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync a local mirror of the Notion app database')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='Notion app database')
+    parser.add_argument('--mirror', default=DEFAULT_MIRROR, help='Mirror database to create or update')
+    parser.add_argument('--full', action='store_true', help='Compare every row version instead of using watermarks')
+    parser.add_argument('--prune', action='store_true', help='Delete rows the app no longer has')
+    args = parser.parse_args()
+
+    mirror = NotionMirror(os.path.expanduser(args.source), args.mirror)
+    start = time.perf_counter()
+    stats = mirror.sync(full=args.full, prune=args.prune)
+    elapsed = time.perf_counter() - start
+
+    for table, counts in stats.items():
+        print(f"{table:12} copied {counts['copied']:>8}  deleted {counts['deleted']:>8}")
+    print(f"Synced in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()